@@ -1,68 +1,113 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, current_app, jsonify, request
 from flask_cors import CORS
+import os
 import traceback
 import datetime
+import click
 import jwt
 from functools import wraps
-from config import DevelopmentConfig
-from reports import generate_simulation_pdf, generate_simulation_excel, generate_comparison_excel
+from config import config_from_env
 from flask import send_file
-
-# traci will be imported/used by simulation.start_simulation
-import traci as traci_module
-
-from simulation import simulate_sensors, start_simulation, set_signal_state
-from models import db, User, Simulation, TrafficData
+from flask.cli import with_appcontext
+
+from models import db, User, Simulation, SimulationArchive, SignalEvent, TrafficData
+from http_cache import compress_response, conditional
+from db_engine import init_engine
+from retention import global_stats, legacy_emergency_counts, run_retention_pass, simulation_stats, start_retention_worker, traffic_rows
+from checkpoints import checkpoint_dict, resume_problem, simulation_checkpoints, warm_start_problem
+from events import EVENT_KINDS, emergency_stats, emergency_stats_by_simulation, event_dict, events_version, signal_timeline, simulation_events
 from werkzeug.security import generate_password_hash, check_password_hash
 
-app = Flask(__name__)
-CORS(app,supports_credentials=True)
-# For more fine grained control on CORS
-# CORS(app, 
-#      origins=[
-#          "http://localhost:3000",      # React development server
-#          "http://127.0.0.1:5000",      # Flask server
-#          # Add deployment domain if ever deployed lol
-#      ],
-#      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-#      allow_headers=["Content-Type", "Authorization"],
-#      supports_credentials=True
-# )
+# The simulation (traci) and report (ReportLab/openpyxl) backends are imported
+# inside the routes that need them, so creating the app and serving the common
+# endpoints never pays for those imports.
 
-# Load config from config.py
-app.config.from_object(DevelopmentConfig)
+api = Blueprint("api", __name__)
 
-db.init_app(app)
+# In "shared" serving mode the simulation runs in a separate owner process
+# (see serving.py) and this worker only talks to it through this client.
+sim_client = None
 
-# globals
-traci = None
-sensor_generator = None
-current_simulation_id = None
+
+def create_app(config_object=None):
+    """
+    Application factory; used by `flask run`, gunicorn and serving.py. Without
+    config_object the config comes from FLASK_CONFIG (see config.config_from_env).
+    """
+    app = Flask(__name__)
+    CORS(app,supports_credentials=True)
+    # For more fine grained control on CORS
+    # CORS(app, 
+    #      origins=[
+    #          "http://localhost:3000",      # React development server
+    #          "http://127.0.0.1:5000",      # Flask server
+    #          # Add deployment domain if ever deployed lol
+    #      ],
+    #      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    #      allow_headers=["Content-Type", "Authorization"],
+    #      supports_credentials=True
+    # )
+
+    # Load config from config.py
+    app.config.from_object(config_object or config_from_env())
+
+    init_engine(app)
+    app.register_blueprint(api)
+    app.after_request(compress_response)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(retention_run_command)
+
+    return app
 
 
 def ensure_db_and_default_user():
     """Create tables and default admin user (username='admin', password='admin') if missing."""
-    with app.app_context():
-        db.create_all()
-        admin_username= "admin"
-        admin_email = "admin@gmail.com"
-        admin = User.query.filter_by(username=admin_username).first()
-        if not admin:
-            admin = User(
-                username= admin_username,
-                email=admin_email,
-                password_hash=generate_password_hash("admin"),
-                role="admin",
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Created default admin user: admin/admin (email field = 'admin').")
-        else:
-            print("Default admin user already exists.")
-
-with app.app_context():
+    db.create_all()
+    # create_all() skips tables that already exist; add columns and indexes introduced later
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    admin_username= "admin"
+    admin_email = "admin@gmail.com"
+    admin = User.query.filter_by(username=admin_username).first()
+    if not admin:
+        admin = User(
+            username= admin_username,
+            email=admin_email,
+            password_hash=generate_password_hash("admin"),
+            role="admin",
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("Created default admin user: admin/admin (email field = 'admin').")
+    else:
+        print("Default admin user already exists.")
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """One-time bootstrap: `flask --app app init-db`."""
     ensure_db_and_default_user()
 
+
+@click.command("retention-run")
+@click.option("--max-seconds", type=float, default=None, help="Stop after this long (default RETENTION_PASS_SECONDS).")
+@with_appcontext
+def retention_run_command(max_seconds):
+    """Compact raw traffic data of old ended simulations (resumable)."""
+    compacted = run_retention_pass(max_seconds)
+    print(f"Compacted {compacted} simulation(s).")
+
+
 def token_required(f):
     """Decorator to require JWT token for protected routes."""
     @wraps(f)
@@ -81,7 +126,7 @@ def token_required(f):
             return jsonify({'message': 'Token is missing'}), 401
         
         try:
-            data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
             current_user = User.query.filter_by(email=data['email']).first()
             if not current_user:
                 return jsonify({'message': 'Token is invalid'}), 401
@@ -106,7 +151,7 @@ def admin_required(f):
     return decorated
 
 
-@app.route("/api/login", methods=["POST"])
+@api.route("/api/login", methods=["POST"])
 def login():
     """Authenticate user and return JWT token."""
     data = request.get_json()
@@ -117,32 +162,31 @@ def login():
     username = data['username']
     password = data['password']
     
-    with app.app_context():
-        user = User.query.filter_by(username=username).first()
+    user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password_hash, password):
-            # Generate JWT token - using config value
-            token = jwt.encode({
+    if user and check_password_hash(user.password_hash, password):
+        # Generate JWT token - using config value
+        token = jwt.encode({
+            'username': user.username,
+            'email': user.email,
+            'role': user.role,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=current_app.config['JWT_EXPIRATION_HOURS'])
+        }, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+            
+        return jsonify({
+            'token': token,
+            'user': {
                 'username': user.username,
                 'email': user.email,
-                'role': user.role,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=app.config['JWT_EXPIRATION_HOURS'])
-            }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-            
-            return jsonify({
-                'token': token,
-                'user': {
-                    'username': user.username,
-                    'email': user.email,
-                    'role': user.role
-                },
-                'expires_in': app.config['JWT_EXPIRATION_HOURS'] * 60 * 60  # hours to seconds
-            }), 200
+                'role': user.role
+            },
+            'expires_in': current_app.config['JWT_EXPIRATION_HOURS'] * 60 * 60  # hours to seconds
+        }), 200
         
-        return jsonify({'message': 'Invalid credentials'}), 401
+    return jsonify({'message': 'Invalid credentials'}), 401
 
 
-@app.route("/api/users", methods=["POST"])
+@api.route("/api/users", methods=["POST"])
 @token_required
 @admin_required
 def create_user(current_user):
@@ -161,338 +205,402 @@ def create_user(current_user):
     if role not in ['user', 'admin']:
         return jsonify({'message': 'Invalid role. Must be "user" or "admin"'}), 400
     
-    with app.app_context():
-        # Check if user already exists
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user:
-            return jsonify({'message': 'User already exists'}), 409
+    # Check if user already exists
+    existing_user = User.query.filter_by(username=username).first()
+    if existing_user:
+        return jsonify({'message': 'User already exists'}), 409
         
-        # Create new user
-        new_user = User(
-            username=username,
-            email=email,
-            password_hash=generate_password_hash(password),
-            role=role
-        )
+    # Create new user
+    new_user = User(
+        username=username,
+        email=email,
+        password_hash=generate_password_hash(password),
+        role=role
+    )
         
-        try:
-            db.session.add(new_user)
-            db.session.commit()
+    try:
+        db.session.add(new_user)
+        db.session.commit()
             
-            return jsonify({
-                'message': 'User created successfully',
-                'user': {
-                    'username': new_user.username,
-                    'email': new_user.email,
-                    'role': new_user.role
-                }
-            }), 201
+        return jsonify({
+            'message': 'User created successfully',
+            'user': {
+                'username': new_user.username,
+                'email': new_user.email,
+                'role': new_user.role
+            }
+        }), 201
             
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({'message': 'Failed to create user'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to create user'}), 500
 
 
-@app.route("/api/users", methods=["GET"])
+@api.route("/api/users", methods=["GET"])
 @token_required
 @admin_required
 def list_users(current_user):
     """List all users (admin only)."""
-    with app.app_context():
-        users = User.query.all()
-        return jsonify([
-            {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role
-            } for user in users
-        ]), 200
-
-
-def restart_simulation():
-    """
-    Closes any existing SUMO connection and starts a new one.
-    Also creates a Simulation DB row and stores current_simulation_id.
-    """
-    global traci, sensor_generator, current_simulation_id
-
-    try:
-        if traci:
-            try:
-                traci_module.close(False)
-            except Exception:
-                # ignore any close errors
-                pass
-            traci = None
-    except Exception:
-        pass
+    users = User.query.all()
+    return jsonify([
+        {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': user.role
+        } for user in users
+    ]), 200
 
-    traci = start_simulation()
-    if not traci:
-        return False
 
-    sensor_generator = simulate_sensors()
+def shared_serving():
+    return current_app.config["SIM_SERVING_MODE"] == "shared"
 
-    # Create a simulation record in DB
-    with app.app_context():
-        sim = Simulation(start_time=datetime.datetime.utcnow())
-        db.session.add(sim)
-        db.session.commit()
-        current_simulation_id = sim.id
-        print(f"Started new simulation id={current_simulation_id}")
 
-    return True
+def get_sim_client():
+    global sim_client
+    if sim_client is None:
+        from serving import SimulationClient
+        sim_client = SimulationClient(current_app.config)
+    return sim_client
 
 
-def end_current_simulation():
-    """Set end_time for current simulation in DB."""
-    global current_simulation_id
-    with app.app_context():
-        if current_simulation_id is not None:
-            sim = Simulation.query.get(current_simulation_id)
-            if sim and sim.end_time is None:
-                sim.end_time = datetime.datetime.utcnow()
-                db.session.commit()
-                print(f"Marked simulation id={current_simulation_id} ended at {sim.end_time}")
-    current_simulation_id = None
-
-
-def store_sensor_readings(sensors):
-    """
-    sensors returned from simulate_sensors() contains:
-      - per-lane counts (sensors['north_in_0'], etc.)
-      - sensors['queue_length'][lane]
-      - sensors['avg_speed'][lane]
-      - sensors['emergency']
-    We'll insert a row per lane with the current simulation id.
-    """
-    global current_simulation_id
-    if current_simulation_id is None:
-        return
+def owner_unavailable():
+    return jsonify({"error": "Simulation service unavailable"}), 503
 
-    timestamp = datetime.datetime.utcnow()
-    lane_keys = [k for k in sensors.keys() if isinstance(k, str) and k.endswith(("_in_0", "_in_1"))]
 
-    with app.app_context():
-        rows = []
-        for lane in lane_keys:
-            try:
-                vehicle_count = int(round(float(sensors.get(lane, 0))))
-            except Exception:
-                vehicle_count = 0
-            try:
-                queue_length = int(round(float(sensors.get("queue_length", {}).get(lane, 0))))
-            except Exception:
-                queue_length = 0
-            try:
-                avg_speed = float(sensors.get("avg_speed", {}).get(lane, 0.0))
-            except Exception:
-                avg_speed = 0.0
-
-            td = TrafficData(
-                simulation_id=current_simulation_id,
-                timestamp=timestamp,
-                lane=lane,
-                vehicle_count=vehicle_count,
-                queue_length=queue_length,
-                avg_speed=avg_speed,
-                emergency=bool(sensors.get("emergency", False)),
-            )
-            rows.append(td)
-        if rows:
-            db.session.bulk_save_objects(rows)
-            db.session.commit()
-
-
-@app.route("/api/sensors", methods=["GET"])
+@api.route("/api/sensors", methods=["GET"])
 @token_required
 def sensors(current_user):
-    global traci, sensor_generator
-
+    if shared_serving():
+        # Latest snapshot straight from shared memory, already serialized
+        body = get_sim_client().snapshot()
+        if body is None:
+            return owner_unavailable()
+        return current_app.response_class(body, status=200, mimetype="application/json")
+
+    import runtime
     try:
-        # If no sim or sim has ended
-        if not traci or traci.simulation.getMinExpectedNumber() == 0:
-            end_current_simulation()  # mark in DB
-            return jsonify({
-                "simulation_running": False,
-                "message": "No active simulation"
-            }), 200
-
-        sensors = next(sensor_generator)  # may raise StopIteration
-        store_sensor_readings(sensors)
-        sensors["simulation_id"] = current_simulation_id
-        sensors["simulation_running"] = True
-        return jsonify(sensors), 200
-
-    except StopIteration:
-        # Simulation ended
-        end_current_simulation()
-        return jsonify({
-            "simulation_running": False,
-            "message": "Simulation ended"
-        }), 200
+        return jsonify(runtime.advance()), 200
 
     except Exception as e:
         print(f"Error in /api/sensors: {e}\n{traceback.format_exc()}")
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/signal", methods=["POST"])
+@api.route("/api/signal", methods=["POST"])
 @token_required
 def signal(current_user):
-    global traci, sensor_generator
-    try:
-        # If no sim or sim ended
-        if not traci or traci.simulation.getMinExpectedNumber() == 0:
-            end_current_simulation()
-            return jsonify({
-                "simulation_running": False,
-                "message": "No active simulation"
-            }), 200
-
-        data = request.json or {}
-        mode = data.get("mode", "auto")
-        sensors = {"mode": mode}
-
-        if mode == "manual":
-            sensors["lane"] = data.get("lane")
-            sensors["state"] = data.get("state")
-            sensors["emergency"] = False
-            sensors["emergency_lane"] = None
-        else:
-            sensors.update(next(sensor_generator))  # reuse current sensor data
-
-        set_signal_state(traci, "junction1", sensors)
+    data = request.json or {}
 
-        return jsonify({
-            "status": "Signal updated",
-            "mode": mode,
-            "simulation_running": True,
-            "simulation_id": current_simulation_id
-        }), 200
+    if shared_serving():
+        reply = get_sim_client().send("signal", data=data)
+        if reply is None:
+            return owner_unavailable()
+        if "error" in reply:
+            return jsonify(reply), 500
+        return jsonify(reply), 200
 
-    except StopIteration:
-        end_current_simulation()
-        return jsonify({
-            "simulation_running": False,
-            "message": "Simulation ended"
-        }), 200
+    import runtime
+    try:
+        return jsonify(runtime.apply_signal(data)), 200
 
     except Exception as e:
         print(f"Error in /api/signal: {e}\n{traceback.format_exc()}")
         return jsonify({"error": "Internal server error"}), 500
     
 
-@app.route("/api/simulations/start", methods=["POST"])
+def parse_window(data, max_window):
+    """
+    Read the coarse-tick settings of a /api/simulations/start body:
+    {"window": <steps per snapshot>, "window_mode": "accumulate" | "jump"}.
+    Returns (window, jump) or raises ValueError. Jump mode only samples the last
+    step of each window and runs the controller once per window, so emergencies
+    inside a window are missed or not preempted (see simulate_windowed_sensors).
+    """
+    try:
+        window = int(data.get("window", 1))
+    except (TypeError, ValueError):
+        raise ValueError("window must be an integer")
+    if not 1 <= window <= max_window:
+        raise ValueError(f"window must be between 1 and {max_window}")
+    mode = data.get("window_mode", "accumulate")
+    if mode not in ("accumulate", "jump"):
+        raise ValueError('window_mode must be "accumulate" or "jump"')
+    return window, mode == "jump"
+
+
+@api.route("/api/simulations/start", methods=["POST"])
 @token_required
 def start_new_simulation(current_user):
-    end_current_simulation()
-    if restart_simulation():
-        return jsonify({"message": "Simulation started", "id": current_simulation_id}), 200
+    """
+    Start a new simulation. Optional body: the window settings (see
+    parse_window) and "checkpoint_id" to warm-start from a saved checkpoint.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        window, jump = parse_window(data, current_app.config["SIM_MAX_WINDOW"])
+        checkpoint_id = int(data["checkpoint_id"]) if data.get("checkpoint_id") is not None else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if checkpoint_id is not None:
+        problem = warm_start_problem(checkpoint_id)
+        if problem:
+            return jsonify({"error": problem[0]}), problem[1]
+
+    if shared_serving():
+        reply = get_sim_client().send("start", window=window, jump=jump, checkpoint_id=checkpoint_id)
+        if reply is None:
+            return owner_unavailable()
+        if reply.get("ok"):
+            return jsonify({"message": "Simulation started", "id": reply["id"], "window": reply["window"]}), 200
+        return jsonify({"error": "Failed to start simulation"}), 500
+
+    import runtime
+    runtime.end_current_simulation()
+    if runtime.restart_simulation(window=window, jump=jump, checkpoint_id=checkpoint_id):
+        return jsonify({"message": "Simulation started", "id": runtime.current_simulation_id, "window": runtime.current_window}), 200
     return jsonify({"error": "Failed to start simulation"}), 500
 
-@app.route("/api/simulations/end", methods=["POST"])
+
+@api.route("/api/simulations/<int:simulation_id>/resume", methods=["POST"])
+@token_required
+def resume_simulation(current_user, simulation_id):
+    """Continue a simulation from its latest checkpoint (after a crash, restart or deploy)."""
+    problem = resume_problem(simulation_id)
+    if problem:
+        return jsonify({"error": problem[0]}), problem[1]
+
+    if shared_serving():
+        reply = get_sim_client().send("resume", simulation_id=simulation_id)
+        if reply is None:
+            return owner_unavailable()
+        if reply.get("ok"):
+            return jsonify({"message": "Simulation resumed", "id": reply["id"], "window": reply["window"]}), 200
+        return jsonify({"error": "Failed to resume simulation"}), 500
+
+    import runtime
+    if runtime.resume_simulation(simulation_id):
+        return jsonify({"message": "Simulation resumed", "id": runtime.current_simulation_id, "window": runtime.current_window}), 200
+    return jsonify({"error": "Failed to resume simulation"}), 500
+
+
+@api.route("/api/simulations/checkpoint", methods=["POST"])
+@token_required
+def checkpoint_simulation(current_user):
+    """Take a pinned (never pruned) checkpoint of the running simulation, e.g. to warm-start from."""
+    if shared_serving():
+        reply = get_sim_client().send("checkpoint")
+        if reply is None:
+            return owner_unavailable()
+        checkpoint = reply.get("checkpoint")
+    else:
+        import runtime
+        checkpoint = runtime.take_checkpoint(pinned=True)
+        checkpoint = checkpoint_dict(checkpoint) if checkpoint else None
+
+    if checkpoint is None:
+        return jsonify({"error": "No active simulation"}), 409
+    return jsonify(checkpoint), 201
+
+
+@api.route("/api/simulations/<int:simulation_id>/checkpoints", methods=["GET"])
+@token_required
+def list_checkpoints(current_user, simulation_id):
+    if db.session.get(Simulation, simulation_id) is None:
+        return jsonify({"error": "Simulation not found"}), 404
+    return jsonify([checkpoint_dict(c) for c in simulation_checkpoints(simulation_id)])
+
+@api.route("/api/simulations/end", methods=["POST"])
 @token_required
 def end_simulation(current_user):
-    end_current_simulation()
+    if shared_serving():
+        if get_sim_client().send("end") is None:
+            return owner_unavailable()
+        return jsonify({"message": "Simulation ended"}), 200
+
+    import runtime
+    runtime.end_current_simulation()
     return jsonify({"message": "Simulation ended"}), 200
 
 
-@app.route("/api/simulations", methods=["GET"])
+# Data versions for conditional GETs (see http_cache.py). Each is a couple of
+# indexed lookups, far cheaper than building the response.
+
+def simulations_version():
+    # generation: a resumed and ended-again simulation has the same counts but a new end_time
+    return db.session.query(
+        db.func.count(Simulation.id), db.func.max(Simulation.id), db.func.count(Simulation.end_time),
+        db.func.sum(Simulation.generation),
+    ).one()
+
+
+def traffic_version(simulation_id):
+    sim = db.session.get(Simulation, simulation_id)
+    if sim is None:
+        return ("missing",)
+    if sim.end_time is not None:
+        # nothing is ingested after a simulation ends
+        return ("ended", sim.generation, sim.end_time.isoformat())
+    last_row = db.session.query(db.func.max(TrafficData.id)).filter(TrafficData.simulation_id == simulation_id).scalar()
+    return ("running", sim.generation, last_row)
+
+
+def traffic_immutable(version):
+    return version[0] == "ended"
+
+
+def dashboard_version():
+    return (
+        simulations_version(),
+        db.session.query(db.func.sum(Simulation.generation)).scalar(),
+        db.session.query(db.func.max(TrafficData.id)).scalar(),
+        db.session.query(db.func.max(SignalEvent.id)).scalar(),
+        db.session.query(db.func.count(SimulationArchive.simulation_id)).filter(SimulationArchive.status == "compacted").scalar(),
+    )
+
+
+@api.route("/api/simulations", methods=["GET"])
 @token_required
+@conditional(simulations_version)
 def list_simulations(current_user):
     """Return list of simulations (id, start_time, end_time)."""
-    with app.app_context():
-        sims = Simulation.query.order_by(Simulation.id.desc()).limit(50).all()
-        return jsonify([
-            {"id": s.id, "start_time": s.start_time.isoformat(), "end_time": s.end_time.isoformat() if s.end_time else None}
-            for s in sims
-        ])
+    sims = Simulation.query.order_by(Simulation.id.desc()).limit(50).all()
+    return jsonify([
+        {"id": s.id, "start_time": s.start_time.isoformat(), "end_time": s.end_time.isoformat() if s.end_time else None}
+        for s in sims
+    ])
 
 
-@app.route("/api/traffic/<int:simulation_id>", methods=["GET"])
+@api.route("/api/traffic/<int:simulation_id>", methods=["GET"])
 @token_required
+@conditional(traffic_version, traffic_immutable)
 def get_traffic_for_sim(current_user, simulation_id):
     """Return latest traffic rows for a simulation (paginated simple)."""
-    with app.app_context():
-        rows = TrafficData.query.filter_by(simulation_id=simulation_id).order_by(TrafficData.timestamp.asc()).limit(2000).all()
-        return jsonify([
-            {
-                "timestamp": r.timestamp.isoformat(),
-                "lane": r.lane,
-                "vehicle_count": r.vehicle_count,
-                "queue_length": r.queue_length,
-                "avg_speed": r.avg_speed,
-                "emergency": r.emergency
-            } for r in rows
-        ])
-
-
-@app.route("/api/dashboard/summary", methods=["GET"])
+    rows = traffic_rows(simulation_id, limit=2000)
+    return jsonify([
+        {
+            "timestamp": r.timestamp.isoformat(),
+            "lane": r.lane,
+            "vehicle_count": r.vehicle_count,
+            "queue_length": r.queue_length,
+            "avg_speed": r.avg_speed,
+            "emergency": r.emergency
+        } for r in rows
+    ])
+
+
+@api.route("/api/simulations/<int:simulation_id>/events", methods=["GET"])
 @token_required
-def dashboard_summary(current_user):
-    with app.app_context():
-        # Global stats
-        total_sims = Simulation.query.count()
-        total_vehicles = db.session.query(db.func.sum(TrafficData.vehicle_count)).scalar() or 0
-        avg_queue = db.session.query(db.func.avg(TrafficData.queue_length)).scalar() or 0
-        emergency_count = db.session.query(db.func.count()).filter(TrafficData.emergency == True).scalar() or 0
-
-        current_sim = Simulation.query.filter(Simulation.end_time == None).first()
-
-        # Per-simulation aggregates (last 5 simulations, newest first)
-        sims = Simulation.query.order_by(Simulation.id.desc()).limit(5).all()
-        sim_summaries = []
-        for s in sims:
-            stats = db.session.query(
-                db.func.sum(TrafficData.vehicle_count),
-                db.func.avg(TrafficData.queue_length),
-                db.func.count().filter(TrafficData.emergency == True)
-            ).filter(TrafficData.simulation_id == s.id).first()
-
-            sim_summaries.append({
-                "id": s.id,
-                "start_time": s.start_time.isoformat(),
-                "end_time": s.end_time.isoformat() if s.end_time else None,
-                "total_vehicles": int(stats[0] or 0),
-                "avg_queue_length": float(stats[1] or 0),
-                "emergencies": int(stats[2] or 0)
-            })
+@conditional(events_version, traffic_immutable)
+def get_simulation_events(current_user, simulation_id):
+    """
+    Controller events of a simulation in time order. Optional query parameters:
+    kind (comma-separated, see events.EVENT_KINDS), junction, since/until
+    (simulation seconds) and limit (1 to 5000, default 1000).
+    """
+    if db.session.get(Simulation, simulation_id) is None:
+        return jsonify({"error": "Simulation not found"}), 404
 
-        return jsonify({
-            "global": {
-                "total_simulations": total_sims,
-                "total_vehicles": int(total_vehicles),
-                "avg_queue_length": float(avg_queue),
-                "emergencies_handled": int(emergency_count),
-                "current_simulation": {
-                    "id": current_sim.id if current_sim else None,
-                    "start_time": current_sim.start_time.isoformat() if current_sim else None
-                }
-            },
-            "recent_simulations": sim_summaries
+    kinds = [k for k in request.args.get("kind", "").split(",") if k]
+    unknown = [k for k in kinds if k not in EVENT_KINDS]
+    if unknown:
+        return jsonify({"error": f"Unknown event kind(s): {', '.join(unknown)}"}), 400
+    try:
+        since, until = (float(request.args[k]) if k in request.args else None for k in ("since", "until"))
+        limit = min(int(request.args.get("limit", 1000)), 5000)
+    except ValueError:
+        return jsonify({"error": "since, until and limit must be numbers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+
+    rows = simulation_events(simulation_id, kinds=kinds, junction_id=request.args.get("junction"),
+                             since=since, until=until, limit=limit)
+    return jsonify([event_dict(e) for e in rows])
+
+
+@api.route("/api/simulations/<int:simulation_id>/timeline", methods=["GET"])
+@token_required
+@conditional(events_version, traffic_immutable)
+def get_signal_timeline(current_user, simulation_id):
+    """Phase intervals per junction: {junction_id: [{phase, source, start, end}, ...]}."""
+    if db.session.get(Simulation, simulation_id) is None:
+        return jsonify({"error": "Simulation not found"}), 404
+    return jsonify(signal_timeline(simulation_id, junction_id=request.args.get("junction")))
+
+
+@api.route("/api/dashboard/summary", methods=["GET"])
+@token_required
+@conditional(dashboard_version)
+def dashboard_summary(current_user):
+    # Global stats
+    total_sims = Simulation.query.count()
+    # raw rows plus rollups of compacted simulations (see retention.py)
+    total_vehicles, avg_queue = global_stats()
+    # emergencies from the event store (see events.py), plus the flagged
+    # readings of simulations recorded before it
+    emergencies = emergency_stats()
+    legacy_emergencies = legacy_emergency_counts()
+
+    current_sim = Simulation.query.filter(Simulation.end_time == None).first()
+
+    # Per-simulation aggregates (last 5 simulations, newest first)
+    sims = Simulation.query.order_by(Simulation.id.desc()).limit(5).all()
+    sim_emergencies = emergency_stats_by_simulation([s.id for s in sims])
+    sim_legacy_emergencies = legacy_emergency_counts([s.id for s in sims])
+    sim_summaries = []
+    for s in sims:
+        stats = simulation_stats(s.id)
+
+        sim_summaries.append({
+            "id": s.id,
+            "start_time": s.start_time.isoformat(),
+            "end_time": s.end_time.isoformat() if s.end_time else None,
+            "total_vehicles": int(stats[0] or 0),
+            "avg_queue_length": float(stats[1] or 0),
+            "emergencies": sim_emergencies[s.id]["count"] + sim_legacy_emergencies.get(s.id, 0),
+            "avg_emergency_response_s": sim_emergencies[s.id]["avg_response_s"],
         })
 
-@app.route("/api/reports/simulation/<int:sim_id>.pdf", methods=["GET"])
+    return jsonify({
+        "global": {
+            "total_simulations": total_sims,
+            "total_vehicles": int(total_vehicles),
+            "avg_queue_length": float(avg_queue),
+            "emergencies_handled": emergencies["count"] + sum(legacy_emergencies.values()),
+            "emergency_response": {
+                "avg_s": emergencies["avg_response_s"],
+                "max_s": emergencies["max_response_s"],
+            },
+            "current_simulation": {
+                "id": current_sim.id if current_sim else None,
+                "start_time": current_sim.start_time.isoformat() if current_sim else None
+            }
+        },
+        "recent_simulations": sim_summaries
+    })
+
+@api.route("/api/reports/simulation/<int:sim_id>.pdf", methods=["GET"])
 @token_required
 def simulation_report_pdf(current_user, sim_id):
+    from reports import generate_simulation_pdf
     buffer = generate_simulation_pdf(sim_id)
     if not buffer:
         return jsonify({"error": "Simulation not found"}), 404
     return send_file(buffer, as_attachment=True, download_name=f"simulation_{sim_id}.pdf", mimetype="application/pdf")
 
-@app.route("/api/reports/simulation/<int:sim_id>.xlsx", methods=["GET"])
+@api.route("/api/reports/simulation/<int:sim_id>.xlsx", methods=["GET"])
 @token_required
 def simulation_report_excel(current_user, sim_id):
+    from reports import generate_simulation_excel
     buffer = generate_simulation_excel(sim_id)
     if not buffer:
         return jsonify({"error": "Simulation not found"}), 404
     return send_file(buffer, as_attachment=True, download_name=f"simulation_{sim_id}.xlsx", mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-@app.route("/api/reports/comparison.xlsx", methods=["POST"])
+@api.route("/api/reports/comparison.xlsx", methods=["POST"])
 @token_required
 def comparison_report_excel(current_user):
+    from reports import generate_comparison_excel
     data = request.get_json() or {}
     sim_ids = data.get("simulation_ids", [])
 
@@ -508,5 +616,10 @@ def comparison_report_excel(current_user):
     )
 
 if __name__ == "__main__":
-    ensure_db_and_default_user()
+    app = create_app()
+    with app.app_context():
+        ensure_db_and_default_user()
+    # the reloader imports this module twice; only the serving child runs retention
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_retention_worker(app)
     app.run(debug=True, port=5000)
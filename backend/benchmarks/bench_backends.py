@@ -0,0 +1,72 @@
+"""
+Simulation backend step throughput.
+
+Each backend runs in a fresh interpreter (libsumo allows one simulation per
+process) and steps the bundled network through simulate_sensors(), i.e. lane
+subscriptions, emergency detection and the signal controller every step:
+
+    python benchmarks/bench_backends.py [--steps 2000] [--runs 3] [--window 1]
+
+--window > 1 measures the fast-forward jump mode (one simulationStep per window).
+Throughput is simulated steps per wall-clock second; SUMO start-up is excluded.
+The bundled scenario is restarted as often as needed to reach --steps.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+RUNNER = """
+import sys, time
+import simulation
+steps, elapsed = 0, 0.0
+while steps < {steps}:
+    # the bundled scenario is short; restart it until enough steps have run
+    if simulation.start_simulation({backend!r}) is None:
+        sys.exit(1)
+    sensors = simulation.simulate_sensors(window={window}, jump={window} > 1)
+    start = time.perf_counter()
+    finished = True
+    for _ in sensors:
+        steps += {window}
+        if steps >= {steps}:
+            finished = False
+            break
+    elapsed += time.perf_counter() - start
+    if not finished:
+        sensors.close()
+        simulation.close_simulation()
+print("RESULT", simulation.backend.name, steps, elapsed)
+"""
+
+
+def sample(backend, steps, window):
+    out = subprocess.run(
+        [sys.executable, "-c", RUNNER.format(backend=backend, steps=steps, window=window)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    _, used, done, elapsed = next(line for line in reversed(out) if line.startswith("RESULT ")).split()
+    return used, int(done) / float(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--window", type=int, default=1)
+    args = parser.parse_args()
+
+    for backend in ("traci", "libsumo"):
+        results = [sample(backend, args.steps, args.window) for _ in range(args.runs)]
+        rates = [rate for _, rate in results]
+        used = results[-1][0]
+        label = backend if used == backend else f"{backend} (fell back to {used})"
+        print(f"{label:<28} median {statistics.median(rates):9.0f} steps/s  "
+              f"max {max(rates):9.0f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
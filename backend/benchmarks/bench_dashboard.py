@@ -0,0 +1,92 @@
+"""
+Dashboard read benchmark: /api/dashboard/summary latency over a seeded
+traffic_data table, alone and while a writer thread ingests sensor readings
+(the contention the SQLite WAL setup is meant to remove).
+
+    python benchmarks/bench_dashboard.py [--simulations 20] [--steps 1500] [--requests 50]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from common import fake_sensors, make_app, temp_sqlite_url
+
+
+def seed(app, simulations, steps):
+    import runtime
+    from models import Simulation, db
+
+    with app.app_context():
+        for _ in range(simulations):
+            sim = Simulation()
+            db.session.add(sim)
+            db.session.commit()
+            runtime.current_simulation_id = sim.id
+            for step in range(steps):
+                runtime.store_sensor_readings(fake_sensors(step))
+        runtime.current_simulation_id = None
+
+
+def writer(app, stop):
+    import runtime
+    from models import Simulation, db
+
+    with app.app_context():
+        sim = Simulation()
+        db.session.add(sim)
+        db.session.commit()
+        runtime.current_simulation_id = sim.id
+        step = 0
+        while not stop.is_set():
+            runtime.store_sensor_readings(fake_sensors(step))
+            step += 1
+        runtime.current_simulation_id = None
+
+
+def measure(client, headers, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get("/api/dashboard/summary", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+    return statistics.median(latencies), max(latencies)
+
+
+def run(profile, args):
+    app = make_app(args.database_url or temp_sqlite_url(), profile)
+    seed(app, args.simulations, args.steps)
+
+    client = app.test_client()
+    token = client.post("/api/login", json={"username": "admin", "password": "admin"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    idle = measure(client, headers, args.requests)
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(app, stop))
+    thread.start()
+    try:
+        busy = measure(client, headers, args.requests)
+    finally:
+        stop.set()
+        thread.join()
+    return idle, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--simulations", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=1500)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    for profile in ("default", "tuned"):
+        (idle_median, idle_max), (busy_median, busy_max) = run(profile, args)
+        print(f"{profile:<8} idle median {idle_median:7.1f} ms max {idle_max:7.1f} ms | "
+              f"with writer median {busy_median:7.1f} ms max {busy_max:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
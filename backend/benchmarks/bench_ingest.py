@@ -0,0 +1,49 @@
+"""
+Sensor ingest benchmark: one TrafficData batch (8 lanes) per simulated step,
+committed per step exactly like runtime.store_sensor_readings().
+
+    python benchmarks/bench_ingest.py [--steps 2000] [--database-url URL]
+
+Without --database-url each profile gets a fresh temporary SQLite file.
+Pass a PostgreSQL URL to measure COPY ingest against a server database.
+"""
+import argparse
+import time
+
+from common import fake_sensors, make_app, temp_sqlite_url
+
+
+def run(database_url, profile, steps):
+    app = make_app(database_url, profile)
+    import runtime
+    from models import Simulation, db
+
+    with app.app_context():
+        sim = Simulation()
+        db.session.add(sim)
+        db.session.commit()
+        runtime.current_simulation_id = sim.id
+
+        start = time.perf_counter()
+        for step in range(steps):
+            runtime.store_sensor_readings(fake_sensors(step))
+        elapsed = time.perf_counter() - start
+        runtime.current_simulation_id = None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    for profile in ("default", "tuned"):
+        elapsed = run(args.database_url or temp_sqlite_url(), profile, args.steps)
+        rows = args.steps * 8
+        print(f"{profile:<8} {args.steps} steps / {rows} rows in {elapsed:6.2f} s  "
+              f"({args.steps / elapsed:8.0f} steps/s, {rows / elapsed:9.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
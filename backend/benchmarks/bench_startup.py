@@ -0,0 +1,57 @@
+"""
+Worker cold-start benchmark.
+
+Each sample runs in a fresh interpreter, like a newly forked/spawned worker:
+
+    python benchmarks/bench_startup.py [--runs 10]
+
+"app" is what a worker pays now (create_app only). "app + backends" adds the
+simulation and report imports that used to happen at import time, for
+comparison.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SCENARIOS = {
+    "app": "from app import create_app; create_app()",
+    "app + backends": "from app import create_app; create_app(); import runtime, reports",
+}
+
+TIMER = """
+import sys, time
+start = time.perf_counter()
+exec({code!r})
+print(time.perf_counter() - start)
+print(",".join(m for m in ("traci", "reportlab", "openpyxl") if m in sys.modules))
+"""
+
+
+def sample(code):
+    out = subprocess.run(
+        [sys.executable, "-c", TIMER.format(code=code)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    return float(out[0]), out[1] if len(out) > 1 else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, code in SCENARIOS.items():
+        sample(code)  # warm the bytecode cache
+        results = [sample(code) for _ in range(args.runs)]
+        times = [t * 1000 for t, _ in results]
+        heavy = results[-1][1] or "none"
+        print(f"{name:<16} median {statistics.median(times):7.1f} ms  "
+              f"min {min(times):7.1f} ms  heavy modules loaded: {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Shared helpers for the benchmark scripts (run them from backend/)."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import DevelopmentConfig  # noqa: E402
+
+LANES = ["north_in_0", "north_in_1", "south_in_0", "south_in_1",
+         "east_in_0", "east_in_1", "west_in_0", "west_in_1"]
+
+
+def temp_sqlite_url():
+    handle, path = tempfile.mkstemp(prefix="stms-bench-", suffix=".db")
+    os.close(handle)
+    os.unlink(path)
+    return f"sqlite:///{path}"
+
+
+def make_app(database_url, profile, **overrides):
+    """Fresh app + schema on the given database with the chosen engine profile."""
+    from app import create_app, ensure_db_and_default_user
+
+    settings = {"SQLALCHEMY_DATABASE_URI": database_url, "DB_ENGINE_PROFILE": profile, "DEBUG": False}
+    settings.update(overrides)
+    app = create_app(type("BenchConfig", (DevelopmentConfig,), settings))
+    with app.app_context():
+        ensure_db_and_default_user()
+    return app
+
+
+def fake_sensors(step):
+    """A /api/sensors-shaped reading that changes every step."""
+    sensors = {lane: (step + i) % 7 for i, lane in enumerate(LANES)}
+    sensors["queue_length"] = {lane: (step * 3 + i) % 5 for i, lane in enumerate(LANES)}
+    sensors["avg_speed"] = {lane: 5.0 + (step + i) % 9 for i, lane in enumerate(LANES)}
+    sensors["emergency"] = step % 50 == 0
+    sensors["emergency_lane"] = "north_in_0" if sensors["emergency"] else None
+    return sensors
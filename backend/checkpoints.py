@@ -0,0 +1,155 @@
+"""
+Simulation checkpoints and warm starts.
+
+A checkpoint is SUMO's own saved state (saveState, gzip XML, with SUMO's RNG
+states) plus the controller state from simulation.export_controller_state(),
+recorded as a SimulationCheckpoint row of its simulation. runtime.advance()
+takes one every CHECKPOINT_INTERVAL simulated seconds and keeps the newest
+CHECKPOINT_KEEP of each simulation while it runs. When a simulation ends (other
+than by an owner shutdown, which is meant to be resumed) or is archived, its
+periodic checkpoints are deleted; pinned ones (taken on request) are kept.
+
+A checkpoint can be used to
+  - resume its own simulation after a crash or deploy: readings, events and
+    checkpoints recorded after it are discarded and the run continues from it;
+  - warm-start a new simulation, skipping the ramp-up the checkpoint covers.
+"""
+import json
+import os
+
+from flask import current_app
+
+from models import db, Simulation, SimulationArchive, SimulationCheckpoint, SignalEvent, TrafficData
+
+# simulation (and with it traci) is imported where a checkpoint is saved or
+# restored, so web workers can use the query helpers without loading it
+
+
+def checkpoint_dir():
+    return current_app.config["CHECKPOINT_DIR"] or os.path.join(current_app.instance_path, "checkpoints")
+
+
+def checkpoint_dict(c):
+    return {
+        "id": c.id,
+        "simulation_id": c.simulation_id,
+        "sim_time": c.sim_time,
+        "created_at": c.created_at.isoformat(),
+        "window": {"size": c.window_size, "mode": c.window_mode},
+        "pinned": c.pinned,
+    }
+
+
+def save_checkpoint(traci, simulation_id, window, pinned=False):
+    """Checkpoint the running simulation; returns the committed SimulationCheckpoint."""
+    from simulation import export_controller_state
+    os.makedirs(checkpoint_dir(), exist_ok=True)
+    checkpoint = SimulationCheckpoint(
+        simulation_id=simulation_id,
+        sim_time=traci.simulation.getTime(),
+        state_path="",
+        controller_state=json.dumps(export_controller_state(traci)),
+        window_size=window["size"],
+        window_mode=window["mode"],
+        pinned=pinned,
+    )
+    db.session.add(checkpoint)
+    db.session.flush()
+    checkpoint.state_path = os.path.join(checkpoint_dir(), f"checkpoint_{checkpoint.id}.xml.gz")
+    try:
+        traci.simulation.saveState(checkpoint.state_path)
+    except Exception:
+        # the row only becomes visible once its state file is complete
+        db.session.rollback()
+        raise
+    db.session.commit()
+    prune_checkpoints(simulation_id, current_app.config["CHECKPOINT_KEEP"])
+    return checkpoint
+
+
+def delete_checkpoints(checkpoints):
+    for c in checkpoints:
+        try:
+            os.remove(c.state_path)
+        except OSError:
+            pass
+        db.session.delete(c)
+    db.session.commit()
+
+
+def prune_checkpoints(simulation_id, keep):
+    """Drop all but the newest `keep` unpinned checkpoints of a simulation."""
+    delete_checkpoints(
+        SimulationCheckpoint.query
+        .filter_by(simulation_id=simulation_id, pinned=False)
+        .order_by(SimulationCheckpoint.sim_time.desc(), SimulationCheckpoint.id.desc())
+        .offset(keep)
+        .all()
+    )
+
+
+def delete_unpinned_checkpoints(simulation_id):
+    """Drop the periodic checkpoints of a simulation that is over (ended or archived)."""
+    delete_checkpoints(SimulationCheckpoint.query.filter_by(simulation_id=simulation_id, pinned=False).all())
+
+
+def restore_controller(traci, checkpoint):
+    """
+    Restore the controller part of a checkpoint. SUMO itself must have been
+    started from checkpoint.state_path (simulation.start_simulation(state_file=)).
+    """
+    from simulation import import_controller_state
+    import_controller_state(traci, json.loads(checkpoint.controller_state))
+
+
+def simulation_checkpoints(simulation_id):
+    return (SimulationCheckpoint.query
+            .filter_by(simulation_id=simulation_id)
+            .order_by(SimulationCheckpoint.sim_time.asc(), SimulationCheckpoint.id.asc())
+            .all())
+
+
+def latest_checkpoint(simulation_id):
+    return (SimulationCheckpoint.query
+            .filter_by(simulation_id=simulation_id)
+            .order_by(SimulationCheckpoint.sim_time.desc(), SimulationCheckpoint.id.desc())
+            .first())
+
+
+def discard_after(checkpoint):
+    """Remove what the simulation recorded after `checkpoint`, before resuming from it."""
+    sim_id = checkpoint.simulation_id
+    TrafficData.query.filter(
+        TrafficData.simulation_id == sim_id, TrafficData.timestamp > checkpoint.created_at
+    ).delete(synchronize_session=False)
+    SignalEvent.query.filter(
+        SignalEvent.simulation_id == sim_id, SignalEvent.sim_time > checkpoint.sim_time
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    delete_checkpoints(
+        SimulationCheckpoint.query
+        .filter(SimulationCheckpoint.simulation_id == sim_id,
+                SimulationCheckpoint.sim_time > checkpoint.sim_time,
+                SimulationCheckpoint.pinned == False)
+        .all()
+    )
+
+
+def resume_problem(simulation_id):
+    """(error message, HTTP status) if the simulation can't be resumed, else None."""
+    if db.session.get(Simulation, simulation_id) is None:
+        return "Simulation not found", 404
+    if db.session.get(SimulationArchive, simulation_id) is not None:
+        return "Simulation has been archived", 409
+    checkpoint = latest_checkpoint(simulation_id)
+    if checkpoint is None or not os.path.exists(checkpoint.state_path):
+        return "Simulation has no checkpoint", 409
+    return None
+
+
+def warm_start_problem(checkpoint_id):
+    """(error message, HTTP status) if a run can't start from the checkpoint, else None."""
+    checkpoint = db.session.get(SimulationCheckpoint, checkpoint_id)
+    if checkpoint is None or not os.path.exists(checkpoint.state_path):
+        return "Checkpoint not found", 404
+    return None
@@ -11,6 +11,65 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///stms.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Database engine layer (db_engine.py): "tuned" or "default" (stock SQLAlchemy settings)
+    DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'tuned')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+    # Retention (retention.py): archive + compact raw traffic rows of ended simulations
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+    RETENTION_AGE_HOURS = float(os.getenv('RETENTION_AGE_HOURS', '168'))
+    RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR')  # defaults to <instance>/archive
+    RETENTION_INTERVAL_SECONDS = int(os.getenv('RETENTION_INTERVAL_SECONDS', '600'))
+    RETENTION_PASS_SECONDS = float(os.getenv('RETENTION_PASS_SECONDS', '60'))
+    RETENTION_MAX_SIMULATIONS = int(os.getenv('RETENTION_MAX_SIMULATIONS', '10'))
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '2000'))
+    RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', '0.05'))  # seconds between delete batches
+
+    # Simulation serving: "inprocess" keeps SUMO inside the Flask process (dev server),
+    # "shared" reads snapshots from the owner process started by gunicorn.conf.py
+    SIM_SERVING_MODE = os.getenv('SIM_SERVING_MODE', 'inprocess')
+    # "traci" (SUMO child process over a socket) or "libsumo" (SUMO inside the
+    # simulating process, no IPC); libsumo falls back to traci when not installed
+    SIM_BACKEND = os.getenv('SIM_BACKEND', 'traci')
+    SIM_STEP_INTERVAL = float(os.getenv('SIM_STEP_INTERVAL', '1.0'))  # seconds between owner steps
+    SIM_MAX_WINDOW = int(os.getenv('SIM_MAX_WINDOW', '3600'))  # max steps per coarse-tick snapshot
+    SIM_SNAPSHOT_SHM = os.getenv('SIM_SNAPSHOT_SHM', 'stms_snapshot')
+    SIM_SNAPSHOT_SIZE = int(os.getenv('SIM_SNAPSHOT_SIZE', str(1024 * 1024)))  # bytes; grows with lane count
+    SIM_CONTROL_ADDRESS = os.getenv('SIM_CONTROL_ADDRESS', '127.0.0.1:5055')
+    SIM_CONTROL_AUTHKEY = os.getenv('SIM_CONTROL_AUTHKEY')  # defaults to JWT_SECRET_KEY
+    SIM_CONTROL_TIMEOUT = float(os.getenv('SIM_CONTROL_TIMEOUT', '30'))
+    # seconds without an owner heartbeat before /api/sensors answers 503; above the slowest step
+    SIM_OWNER_STALE_SECONDS = float(os.getenv('SIM_OWNER_STALE_SECONDS', '15'))
+
+    # Simulation checkpoints (checkpoints.py)
+    CHECKPOINT_INTERVAL = float(os.getenv('CHECKPOINT_INTERVAL', '300'))  # simulated seconds; 0 disables
+    CHECKPOINT_KEEP = int(os.getenv('CHECKPOINT_KEEP', '3'))  # periodic checkpoints kept per simulation
+    CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR')  # defaults to <instance>/checkpoints
+
+    # Controller event store (events.py)
+    EVENTS_BATCH_SIZE = int(os.getenv('EVENTS_BATCH_SIZE', '500'))
+    EVENTS_FLUSH_INTERVAL = float(os.getenv('EVENTS_FLUSH_INTERVAL', '0.5'))  # seconds a batch may wait
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '10000'))  # events beyond this are dropped
+
+    # HTTP caching/compression (http_cache.py)
+    HTTP_CACHE_ENTRIES = int(os.getenv('HTTP_CACHE_ENTRIES', '256'))  # cached bodies of immutable resources
+    HTTP_COMPRESS_MIN_SIZE = int(os.getenv('HTTP_COMPRESS_MIN_SIZE', '1024'))  # bytes
+    HTTP_GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', '6'))
+    HTTP_BROTLI_QUALITY = int(os.getenv('HTTP_BROTLI_QUALITY', '5'))
+
+    # Lookahead phase planner (planner.py) for the auto signal mode
+    PLANNER_ENABLED = os.getenv('PLANNER_ENABLED', 'false').lower() == 'true'
+    PLANNER_WORKERS = int(os.getenv('PLANNER_WORKERS', str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+    PLANNER_HORIZON = int(os.getenv('PLANNER_HORIZON', '30'))  # simulated seconds per plan
+    PLANNER_BUDGET_MS = int(os.getenv('PLANNER_BUDGET_MS', '500'))  # wall-clock limit per decision
+    PLANNER_STATE_DIR = os.getenv('PLANNER_STATE_DIR')  # defaults to a temp dir
+
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
@@ -20,3 +79,14 @@ class ProductionConfig(Config):
     DEBUG = False
     JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', '8'))
 
+
+CONFIGS = {"development": DevelopmentConfig, "production": ProductionConfig}
+
+
+def config_from_env():
+    """Config class named by FLASK_CONFIG ("development" or "production")."""
+    name = os.getenv('FLASK_CONFIG') or 'development'
+    try:
+        return CONFIGS[name]
+    except KeyError:
+        raise ValueError(f"FLASK_CONFIG must be one of {', '.join(CONFIGS)}, not {name!r}")
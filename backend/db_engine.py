@@ -0,0 +1,109 @@
+"""
+Database engine tuning, selected by DB_ENGINE_PROFILE ("tuned" or "default").
+
+- SQLite: WAL journal so dashboard reads don't block on sensor writes,
+  synchronous=NORMAL, a larger page cache, mmap I/O and a busy timeout.
+- Server databases: sized connection pool with pre-ping and recycling.
+- PostgreSQL: TrafficData ingest goes through COPY instead of INSERTs.
+"""
+import csv
+import io
+
+from flask import current_app
+from sqlalchemy import event, insert
+
+from models import db, TrafficData
+
+TRAFFIC_COLUMNS = ("simulation_id", "timestamp", "lane", "vehicle_count", "queue_length", "avg_speed", "emergency")
+
+
+def tuned(app):
+    return app.config["DB_ENGINE_PROFILE"] == "tuned"
+
+
+def engine_options(app):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database; call before db.init_app()."""
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not tuned(app) or uri.startswith("sqlite"):
+        return options
+
+    options.setdefault("pool_size", app.config["DB_POOL_SIZE"])
+    options.setdefault("max_overflow", app.config["DB_MAX_OVERFLOW"])
+    options.setdefault("pool_timeout", app.config["DB_POOL_TIMEOUT"])
+    options.setdefault("pool_recycle", app.config["DB_POOL_RECYCLE"])
+    options.setdefault("pool_pre_ping", True)
+    return options
+
+
+def sqlite_pragmas(app):
+    return (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KB']}",
+        f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+    )
+
+
+def init_engine(app):
+    """Configure the engine and attach db to the app (replaces a bare db.init_app)."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app)
+    db.init_app(app)
+
+    if not tuned(app):
+        return
+
+    with app.app_context():
+        engine = db.engine
+
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(app)
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+
+def bulk_insert_traffic(rows):
+    """
+    Insert TrafficData rows (dicts keyed by TRAFFIC_COLUMNS) in the current
+    session transaction. The caller commits.
+    """
+    if not rows:
+        return
+
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql" and tuned(current_app):
+        copy_traffic_rows(connection, rows)
+    else:
+        # executemany of a Core insert, no ORM unit-of-work per row
+        db.session.execute(insert(TrafficData), rows)
+
+
+def copy_traffic_rows(connection, rows):
+    """Stream rows into traffic_data with COPY (psycopg 3 or psycopg2)."""
+    driver_connection = connection.connection.driver_connection
+    statement = f"COPY {TrafficData.__tablename__} ({', '.join(TRAFFIC_COLUMNS)}) FROM STDIN"
+
+    cursor = driver_connection.cursor()
+    try:
+        if hasattr(cursor, "copy"):
+            # psycopg 3
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    copy.write_row(tuple(row[c] for c in TRAFFIC_COLUMNS))
+        else:
+            # psycopg2
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([row[c] for c in TRAFFIC_COLUMNS])
+            buffer.seek(0)
+            cursor.copy_expert(f"{statement} WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
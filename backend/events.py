@@ -0,0 +1,232 @@
+"""
+Signal controller events: phase changes, emergency episodes, clearance phases
+and manual overrides, in the append-only signal_events table.
+
+The controller never touches the database. simulation.set_signal_state() calls
+its event sink, which is record() here: it only puts a row on a queue. A writer
+thread inserts the queue in batches. end_current_simulation() flushes it before
+the simulation is marked ended, so an ended simulation's events are final.
+
+Readers use the query helpers below; all of them are indexed lookups on
+(simulation_id, ...) or (kind, simulation_id), never scans of traffic_data.
+"""
+import datetime
+import queue
+import threading
+import time
+import traceback
+
+from sqlalchemy import insert
+
+from models import db, Simulation, SignalEvent
+
+EVENT_KINDS = (
+    "phase_change",       # controller switched a junction to a green phase (phase = name)
+    "emergency_start",    # emergency vehicle preempted a junction (lane, phase)
+    "emergency_clear",    # emergency gone (lane, phase it last held); duration = seconds since emergency_start
+    "clearance_start",    # all-red clearance after an emergency
+    "clearance_end",      # duration = seconds of all-red
+    "manual_override",    # /api/signal manual request (lane, phase = requested state)
+)
+
+# Events carrying a phase that stays on until the junction's next one
+TIMELINE_KINDS = ("phase_change", "emergency_start", "clearance_start")
+
+writer = None
+
+
+class EventWriter:
+    """Queue plus batching writer thread for one process."""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config["EVENTS_QUEUE_SIZE"])
+        self.batch_size = app.config["EVENTS_BATCH_SIZE"]
+        self.flush_interval = app.config["EVENTS_FLUSH_INTERVAL"]
+        self.simulation_id = None
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name="stms-events", daemon=True)
+        self.thread.start()
+
+    def record(self, kind, junction_id, sim_time, lane=None, phase=None, duration=None):
+        if self.simulation_id is None:
+            return
+        row = {
+            "simulation_id": self.simulation_id,
+            "junction_id": junction_id,
+            "kind": kind,
+            "sim_time": float(sim_time),
+            "timestamp": datetime.datetime.utcnow(),
+            "lane": lane,
+            "phase": phase,
+            "duration": duration,
+        }
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            # never stall the controller on the database
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"[EVENTS] Queue full, dropped {self.dropped} event(s)")
+
+    def run(self):
+        while True:
+            rows = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    db.session.execute(insert(SignalEvent), rows)
+                    db.session.commit()
+            except Exception as e:
+                print(f"[EVENTS] Failed to write {len(rows)} event(s): {e}\n{traceback.format_exc()}")
+            finally:
+                for _ in rows:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Block until every queued event has been written (or failed)."""
+        self.queue.join()
+
+
+def start_event_writer(app):
+    """The process-wide EventWriter, started on first use."""
+    global writer
+    if writer is None:
+        writer = EventWriter(app)
+    return writer
+
+
+def begin_simulation(app, simulation_id):
+    start_event_writer(app).simulation_id = simulation_id
+
+
+def end_simulation():
+    if writer is not None:
+        flush()
+        writer.simulation_id = None
+
+
+def flush():
+    """Write out queued events, e.g. before a checkpoint, so none before it can be lost."""
+    if writer is not None:
+        writer.flush()
+
+
+def record(kind, junction_id, sim_time, **fields):
+    """Event sink for the controller (see simulation.set_event_sink)."""
+    if writer is not None:
+        writer.record(kind, junction_id, sim_time, **fields)
+
+
+# --- Queries ---
+
+def event_dict(e):
+    return {
+        "id": e.id,
+        "kind": e.kind,
+        "junction_id": e.junction_id,
+        "sim_time": e.sim_time,
+        "timestamp": e.timestamp.isoformat(),
+        "lane": e.lane,
+        "phase": e.phase,
+        "duration": e.duration,
+    }
+
+
+def simulation_events(sim_id, kinds=None, junction_id=None, since=None, until=None, limit=1000):
+    """Events of a simulation in time order, optionally filtered."""
+    query = SignalEvent.query.filter(SignalEvent.simulation_id == sim_id)
+    if kinds:
+        query = query.filter(SignalEvent.kind.in_(kinds))
+    if junction_id is not None:
+        query = query.filter(SignalEvent.junction_id == junction_id)
+    if since is not None:
+        query = query.filter(SignalEvent.sim_time >= since)
+    if until is not None:
+        query = query.filter(SignalEvent.sim_time <= until)
+    return query.order_by(SignalEvent.sim_time.asc(), SignalEvent.id.asc()).limit(limit).all()
+
+
+def timeline_source(e):
+    if e.kind == "clearance_start":
+        return "clearance"
+    # phase changes during an emergency carry the emergency vehicle's lane
+    if e.kind == "emergency_start" or e.lane is not None:
+        return "emergency"
+    return "auto"
+
+
+def signal_timeline(sim_id, junction_id=None):
+    """
+    {junction_id: [{"phase", "source", "start", "end"}, ...]}: which phase each
+    junction showed and from when until when (end is None for the last one).
+    """
+    timeline = {}
+    for e in simulation_events(sim_id, kinds=TIMELINE_KINDS, junction_id=junction_id, limit=None):
+        intervals = timeline.setdefault(e.junction_id, [])
+        if intervals:
+            intervals[-1]["end"] = e.sim_time
+        intervals.append({
+            "phase": "all_red" if e.kind == "clearance_start" else e.phase,
+            "source": timeline_source(e),
+            "start": e.sim_time,
+            "end": None,
+        })
+    return timeline
+
+
+def emergency_query(*columns):
+    return (db.session.query(
+                *columns,
+                db.func.count().filter(SignalEvent.kind == "emergency_start"),
+                db.func.avg(SignalEvent.duration).filter(SignalEvent.kind == "emergency_clear"),
+                db.func.max(SignalEvent.duration).filter(SignalEvent.kind == "emergency_clear"),
+            )
+            .filter(SignalEvent.kind.in_(("emergency_start", "emergency_clear"))))
+
+
+def response_stats(count, avg_response, max_response):
+    return {
+        "count": int(count or 0),
+        "avg_response_s": float(avg_response) if avg_response is not None else None,
+        "max_response_s": float(max_response) if max_response is not None else None,
+    }
+
+
+def emergency_stats():
+    """
+    Emergencies across all simulations: {"count", "avg_response_s", "max_response_s"}.
+    Response time is how long an emergency held its junction (emergency_start
+    to emergency_clear).
+    """
+    return response_stats(*emergency_query().one())
+
+
+def emergency_stats_by_simulation(sim_ids):
+    """{simulation_id: emergency_stats()-shaped dict} for the given simulations."""
+    rows = emergency_query(SignalEvent.simulation_id).filter(
+        SignalEvent.simulation_id.in_(sim_ids)
+    ).group_by(SignalEvent.simulation_id)
+    stats = {sim_id: response_stats(None, None, None) for sim_id in sim_ids}
+    for sim_id, *values in rows:
+        stats[sim_id] = response_stats(*values)
+    return stats
+
+
+def events_version(simulation_id):
+    sim = db.session.get(Simulation, simulation_id)
+    if sim is None:
+        return ("missing",)
+    if sim.end_time is not None:
+        # events are flushed before a simulation is marked ended
+        return ("ended", sim.generation, sim.end_time.isoformat())
+    last_event = db.session.query(db.func.max(SignalEvent.id)).filter(SignalEvent.simulation_id == simulation_id).scalar()
+    return ("running", sim.generation, last_event)
@@ -0,0 +1,30 @@
+# Production server: gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# The master starts one simulation owner process (serving.py) before forking
+# the web workers, and restarts it if it dies; workers only read its
+# shared-memory snapshot.
+import multiprocessing
+import os
+
+os.environ.setdefault("SIM_SERVING_MODE", "shared")
+# create_app() (workers and the owner process) uses config.ProductionConfig
+os.environ.setdefault("FLASK_CONFIG", "production")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+owner_check_interval = float(os.getenv("SIM_OWNER_CHECK_SECONDS", "5"))
+
+
+def on_starting(server):
+    import serving
+    server.sim_owner = serving.start_owner_process()
+    server.sim_owner_supervisor = serving.supervise_owner(server, owner_check_interval)
+
+
+def on_exit(server):
+    import serving
+    supervisor = getattr(server, "sim_owner_supervisor", None)
+    if supervisor is not None:
+        supervisor.set()
+    serving.stop_owner_process(getattr(server, "sim_owner", None))
@@ -0,0 +1,136 @@
+"""
+HTTP caching and compression for the read-heavy JSON endpoints.
+
+- conditional(): the view declares a cheap data version (a few indexed lookups);
+  the ETag is derived from it and a matching If-None-Match is answered with 304
+  before the view runs. Bodies of immutable resources (e.g. an ended
+  simulation) are also kept in a small in-process LRU.
+- compress_response(): after-request hook that gzip- or brotli-encodes large
+  JSON/text bodies according to Accept-Encoding. Brotli is used when the
+  optional `brotli` package is installed.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/plain", "text/csv", "text/html")
+
+
+class BodyCache:
+    """Thread-safe LRU of response bodies keyed by (ETag, content encoding)."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body, max_entries):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+
+body_cache = BodyCache()
+
+
+def make_etag(version):
+    # full_path: filtered views of one resource (?kind=...) are different bodies
+    return hashlib.sha1(repr((request.full_path, version)).encode()).hexdigest()[:20]
+
+
+def conditional(version_fn, immutable_fn=None):
+    """
+    Decorator for JSON views taking (current_user, **view_args).
+
+    version_fn(**view_args) returns any repr()-able value that changes whenever
+    the response would. immutable_fn(version) says whether the body for that
+    version can never change again and may be served from the body cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            version = version_fn(**kwargs)
+            etag = make_etag(version)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                response.headers["Cache-Control"] = "private, no-cache"
+                return response
+
+            immutable = immutable_fn is not None and immutable_fn(version)
+            body = body_cache.get((etag, None)) if immutable else None
+            if body is not None:
+                response = current_app.response_class(body, mimetype="application/json")
+            else:
+                response = make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if immutable:
+                    body_cache.put((etag, None), response.get_data(), current_app.config["HTTP_CACHE_ENTRIES"])
+
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            # lets compress_response() reuse the encoded body too
+            g.cacheable_etag = etag if immutable else None
+            return response
+        return decorated
+    return decorator
+
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def encode(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=current_app.config["HTTP_BROTLI_QUALITY"])
+    return gzip.compress(body, compresslevel=current_app.config["HTTP_GZIP_LEVEL"])
+
+
+def compress_response(response):
+    """after_request hook: compress large JSON/text bodies the client can decode."""
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if response.content_length is None or response.content_length < current_app.config["HTTP_COMPRESS_MIN_SIZE"]:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    etag = g.get("cacheable_etag")
+    body = body_cache.get((etag, encoding)) if etag else None
+    if body is None:
+        body = encode(response.get_data(), encoding)
+        if etag:
+            body_cache.put((etag, encoding), body, current_app.config["HTTP_CACHE_ENTRIES"])
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -21,6 +21,9 @@ class Simulation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     end_time = db.Column(db.DateTime, nullable=True)
+    # bumped on every resume (checkpoints.py); resuming deletes rows past the
+    # checkpoint and their ids can be reused, so data versions include this
+    generation = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     def __repr__(self):
         return f"<Simulation {self.id} start={self.start_time} end={self.end_time}>"
@@ -39,5 +42,99 @@ class TrafficData(db.Model):
 
     simulation = db.relationship("Simulation", backref=db.backref("traffic_rows", lazy="dynamic"))
 
+    __table_args__ = (
+        # per-simulation reads (traffic endpoint, reports, dashboard aggregates)
+        db.Index("ix_traffic_data_simulation_timestamp", "simulation_id", "timestamp"),
+    )
+
     def __repr__(self):
         return f"<TrafficData sim={self.simulation_id} lane={self.lane} count={self.vehicle_count}>"
+
+
+class TrafficRollup(db.Model):
+    """Per-lane, per-minute aggregate of compacted TrafficData rows (see retention.py)."""
+    __tablename__ = "traffic_rollups"
+    id = db.Column(db.Integer, primary_key=True)
+    simulation_id = db.Column(db.Integer, db.ForeignKey("simulations.id"), nullable=False, index=True)
+    lane = db.Column(db.String(128), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    vehicle_sum = db.Column(db.Integer, nullable=False)
+    queue_sum = db.Column(db.Integer, nullable=False)
+    queue_max = db.Column(db.Integer, nullable=False)
+    speed_sum = db.Column(db.Float, nullable=False)
+    emergency_samples = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<TrafficRollup sim={self.simulation_id} lane={self.lane} bucket={self.bucket_start}>"
+
+
+class SimulationArchive(db.Model):
+    """Retention progress for one ended simulation: archiving -> archived -> compacted."""
+    __tablename__ = "simulation_archives"
+    simulation_id = db.Column(db.Integer, db.ForeignKey("simulations.id"), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default="archiving")
+    path = db.Column(db.String(512), nullable=True)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    # while archiving: last TrafficData id written, and the segment size it was committed at
+    last_id = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    segment_size = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<SimulationArchive sim={self.simulation_id} status={self.status}>"
+
+
+class SignalEvent(db.Model):
+    """
+    Append-only controller event (see events.py). kind is one of EVENT_KINDS;
+    sim_time is the SUMO time in seconds, duration is set on events that close
+    an episode (emergency_clear, clearance_end).
+    """
+    __tablename__ = "signal_events"
+    id = db.Column(db.Integer, primary_key=True)
+    simulation_id = db.Column(db.Integer, db.ForeignKey("simulations.id"), nullable=False)
+    junction_id = db.Column(db.String(128), nullable=True)
+    kind = db.Column(db.String(32), nullable=False)
+    sim_time = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    lane = db.Column(db.String(128), nullable=True)
+    phase = db.Column(db.String(255), nullable=True)
+    duration = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        # timelines of one simulation, optionally filtered by kind
+        db.Index("ix_signal_events_simulation_time", "simulation_id", "sim_time"),
+        db.Index("ix_signal_events_simulation_kind", "simulation_id", "kind", "sim_time"),
+        # counts and stats across simulations (dashboard)
+        db.Index("ix_signal_events_kind", "kind", "simulation_id"),
+    )
+
+    def __repr__(self):
+        return f"<SignalEvent sim={self.simulation_id} {self.kind} t={self.sim_time} junction={self.junction_id}>"
+
+
+class SimulationCheckpoint(db.Model):
+    """
+    Restorable point of a simulation (see checkpoints.py): a SUMO state file
+    plus the controller state (junction state, lights, noise RNG) as JSON.
+    Pinned checkpoints are taken on request and never pruned; they are what
+    warm starts are usually made from.
+    """
+    __tablename__ = "simulation_checkpoints"
+    id = db.Column(db.Integer, primary_key=True)
+    simulation_id = db.Column(db.Integer, db.ForeignKey("simulations.id"), nullable=False)
+    sim_time = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    state_path = db.Column(db.String(512), nullable=False)
+    controller_state = db.Column(db.Text, nullable=False)
+    window_size = db.Column(db.Integer, nullable=False, default=1)
+    window_mode = db.Column(db.String(16), nullable=False, default="step")
+    pinned = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index("ix_simulation_checkpoints_simulation_time", "simulation_id", "sim_time"),
+    )
+
+    def __repr__(self):
+        return f"<SimulationCheckpoint {self.id} sim={self.simulation_id} t={self.sim_time}>"
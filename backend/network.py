@@ -0,0 +1,199 @@
+"""
+Network model parsed from the SUMO .net.xml.
+
+The net file is read once with a streaming parse and the result is cached in a
+binary sidecar next to it, keyed by the file's hash, so later starts (and every
+worker process) skip the XML entirely.
+
+Lane IDs are interned to dense integers: NetworkModel.lane_ids[i] is the SUMO
+lane ID of lane i and lane_index maps back. The junction and phase model
+(Junction.lanes, GreenPhase.lanes, sensed_lanes) holds these integers; sensor
+readings stay keyed by SUMO lane ID, as in the /api/sensors payload, and the
+controller goes through lane_ids to look them up.
+"""
+import glob
+import hashlib
+import os
+import pickle
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".stms-cache"
+
+
+@dataclass
+class GreenPhase:
+    index: int               # position in the tlLogic program
+    name: str                # e.g. "north_in+south_in" (edges with priority green)
+    state: str               # red-yellow-green state string
+    lanes: list              # lane indices with green (G or g) in this phase
+    priority_lanes: list     # lane indices with priority green (G)
+
+
+@dataclass
+class Junction:
+    id: str
+    lanes: list                                     # incoming lane indices, net file order
+    green_phases: list = field(default_factory=list)
+    link_count: int = 0
+
+    @property
+    def all_red(self):
+        return "r" * self.link_count
+
+    def phase_for_lane(self, lane):
+        """Green phase giving `lane` (an index) priority green, else any green, else None."""
+        for phase in self.green_phases:
+            if lane in phase.priority_lanes:
+                return phase
+        for phase in self.green_phases:
+            if lane in phase.lanes:
+                return phase
+        return None
+
+
+@dataclass
+class NetworkModel:
+    lane_ids: list                                    # dense lane index -> SUMO lane ID
+    lane_edges: list                                  # dense lane index -> edge ID
+    lane_numbers: list                                # dense lane index -> lane index within the edge
+    edge_names: dict                                  # edge ID -> street name, when the net file has one
+    junctions: dict                                   # traffic light ID -> Junction
+    lane_index: dict = field(default_factory=dict)    # SUMO lane ID -> dense index
+    sensed_lanes: list = field(default_factory=list)  # lanes approaching a controlled junction
+
+    def __post_init__(self):
+        self.lane_index = {lane: i for i, lane in enumerate(self.lane_ids)}
+        seen = set()
+        for junction in self.junctions.values():
+            for lane in junction.lanes:
+                if lane not in seen:
+                    seen.add(lane)
+                    self.sensed_lanes.append(lane)
+
+    def lane_label(self, lane_id):
+        """Readable label for a SUMO lane ID, e.g. "Anzac Parade (Lane 1)"."""
+        i = self.lane_index.get(lane_id)
+        if i is None:
+            return lane_id
+        edge = self.lane_edges[i]
+        return f"{self.edge_names.get(edge) or edge} (Lane {self.lane_numbers[i] + 1})"
+
+
+def sumocfg_net_file(sumocfg_path):
+    """Path of the net file referenced by a .sumocfg."""
+    root = ET.parse(sumocfg_path).getroot()
+    node = root.find("./input/net-file")
+    return os.path.join(os.path.dirname(os.path.abspath(sumocfg_path)), node.get("value"))
+
+
+def parse_network(net_path):
+    """Streaming parse of a .net.xml into a NetworkModel."""
+    lane_ids, lane_edges, lane_numbers = [], [], []
+    edge_names = {}
+    tl_phases = {}        # tl ID -> [state, ...]
+    tl_junctions = {}     # junction ID -> incLanes, for traffic_light junctions
+    links = {}            # tl ID -> {link index: lane ID}
+
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(net_path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # a complete top-level element of <net>
+        tag = elem.tag
+        if tag == "edge":
+            if elem.get("function") != "internal":
+                edge = elem.get("id")
+                if elem.get("name"):
+                    edge_names[edge] = elem.get("name")
+                for lane in elem.iter("lane"):
+                    lane_ids.append(lane.get("id"))
+                    lane_edges.append(edge)
+                    lane_numbers.append(int(lane.get("index")))
+        elif tag == "tlLogic":
+            tl_phases[elem.get("id")] = [p.get("state") for p in elem.iter("phase")]
+        elif tag == "junction":
+            if elem.get("type", "").startswith("traffic_light"):
+                tl_junctions[elem.get("id")] = elem.get("incLanes", "").split()
+        elif tag == "connection":
+            tl = elem.get("tl")
+            if tl is not None:
+                links.setdefault(tl, {})[int(elem.get("linkIndex"))] = f"{elem.get('from')}_{elem.get('fromLane')}"
+        # drop everything parsed so far; memory stays flat on large networks
+        root.clear()
+
+    lane_index = {lane: i for i, lane in enumerate(lane_ids)}
+    junctions = {}
+    for tl, states in tl_phases.items():
+        tl_links = links.get(tl, {})
+        link_count = len(states[0]) if states else 0
+        incoming = tl_junctions.get(tl) or sorted(set(tl_links.values()))
+        junction = Junction(
+            id=tl,
+            lanes=[lane_index[lane] for lane in incoming if lane in lane_index],
+            link_count=link_count,
+        )
+        for i, state in enumerate(states):
+            if "G" not in state and "g" not in state:
+                continue
+            green, priority = [], []
+            for link, signal in enumerate(state):
+                lane = lane_index.get(tl_links.get(link))
+                if lane is None:
+                    continue
+                if signal in "Gg" and lane not in green:
+                    green.append(lane)
+                if signal == "G" and lane not in priority:
+                    priority.append(lane)
+            name = "+".join(sorted({lane_edges[lane] for lane in priority or green})) or f"phase{i}"
+            junction.green_phases.append(GreenPhase(i, name, state, green, priority))
+        junctions[tl] = junction
+
+    return NetworkModel(lane_ids, lane_edges, lane_numbers, edge_names, junctions)
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_network(sumocfg_path):
+    """NetworkModel for a .sumocfg, from the hash-keyed sidecar cache when possible."""
+    net_path = sumocfg_net_file(sumocfg_path)
+    cache_path = f"{net_path}.{file_hash(net_path)}{CACHE_SUFFIX}"
+
+    try:
+        with open(cache_path, "rb") as f:
+            version, model = pickle.load(f)
+        if version == CACHE_VERSION:
+            return model
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+        pass
+
+    model = parse_network(net_path)
+    for stale in glob.glob(f"{glob.escape(net_path)}.*{CACHE_SUFFIX}"):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((CACHE_VERSION, model), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # read-only checkout: still works, just parses on every start
+        print(f"Could not write network cache {cache_path}: {e}")
+    return model
@@ -0,0 +1,143 @@
+"""
+Lookahead phase planner for the auto signal mode.
+
+At each decision the live simulation state is saved (traci.simulation.saveState)
+and candidate phase plans are evaluated in parallel by a pool of worker SUMO
+instances: each worker loads the state, applies one plan and fast-forwards a
+short horizon, scoring the queue (halted vehicle-seconds) plus the waiting time
+left at the end. The first phase of the cheapest plan is applied live.
+
+Decisions have a strict wall-clock budget. Plans that don't finish in time are
+ignored, and if none finish (or the pool is still busy with an earlier
+decision) choose() returns None and the caller falls back to the greedy rule.
+
+The pool serves one decision at a time. Junctions decide independently (each
+when its minimum green runs out), so when several are due in the same step,
+the first one gets the planner and, if its plans are still running when its
+budget ends, the rest of that step's junctions (and later ones, until the
+pool is free) use the greedy rule. Each planned decision costs one saveState()
+and up to budget_ms of the step.
+"""
+import itertools
+import multiprocessing
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from sumo_backend import get_backend
+
+# SUMO API of this pool worker (traci module or libsumo) and the options it was
+# started with, set by _start_worker
+traci = None
+sumo_options = []
+
+
+def _start_worker(sumo_cmd, backend_name):
+    # one SUMO per pool worker process, reused for every evaluation
+    global traci, sumo_options
+    sumo_options = sumo_cmd[1:]
+    backend = get_backend(backend_name)
+    traci = backend.start(sumo_cmd)
+    # close this worker's SUMO when the pool shuts it down (pool workers
+    # don't run atexit handlers, multiprocessing finalizers they do)
+    multiprocessing.util.Finalize(None, backend.close, exitpriority=10)
+
+
+def _evaluate_plan(state_path, junction_id, plan, lanes):
+    """Run one plan from the saved state; returns its cost (lower is better)."""
+    # reload with --load-state rather than simulation.loadState(): the latter
+    # doesn't skip the route file, so vehicles that departed (and left) before
+    # the state's time would be inserted again and distort every score
+    traci.load(sumo_options + ["--load-state", state_path])
+    queue = 0
+    for phase_state, duration in plan:
+        traci.trafficlight.setRedYellowGreenState(junction_id, phase_state)
+        for _ in range(duration):
+            traci.simulationStep()
+            queue += sum(traci.lane.getLastStepHaltingNumber(lane) for lane in lanes)
+    delay = sum(traci.lane.getWaitingTime(lane) for lane in lanes)
+    return queue + delay
+
+
+def candidate_plans(candidates, horizon):
+    """
+    Hold each candidate phase for the whole horizon, or switch to another one
+    halfway. Returns {(first, second): [(state, steps), ...]}.
+    """
+    half = horizon // 2
+    plans = {}
+    for first, second in itertools.product(candidates, repeat=2):
+        if first == second:
+            plans[(first, second)] = [(candidates[first], horizon)]
+        else:
+            plans[(first, second)] = [(candidates[first], half), (candidates[second], horizon - half)]
+    return plans
+
+
+class LookaheadPlanner:
+    def __init__(self, config_path, workers=2, horizon=30, budget_ms=500, state_dir=None, backend_name="traci"):
+        self.horizon = horizon
+        self.budget = budget_ms / 1000.0
+        # a temp dir we made is ours to remove on shutdown; a configured one is not
+        self.owns_state_dir = not state_dir
+        self.state_dir = state_dir or tempfile.mkdtemp(prefix="stms-planner-")
+        os.makedirs(self.state_dir, exist_ok=True)
+        # errors of the live simulation's backend, for the saveState() below
+        self.live_errors = get_backend(backend_name).errors
+        sumo_cmd = ["sumo", "-c", config_path, "--no-step-log", "true", "--no-warnings", "true"]
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_start_worker,
+            initargs=(sumo_cmd, backend_name),
+        )
+        self._pending = []
+
+    def busy(self):
+        self._pending = [f for f in self._pending if not f.done()]
+        return bool(self._pending)
+
+    def choose(self, live_traci, junction_id, candidates, lanes):
+        """
+        candidates: {name: red-yellow-green state}. Returns the name of the phase
+        to apply now, or None when no plan could be scored within the budget.
+        """
+        deadline = time.monotonic() + self.budget
+        if self.busy():
+            # Workers still chewing on a previous decision; don't queue behind it
+            return None
+
+        # safe to overwrite: no worker is still reading the previous state
+        state_path = os.path.join(self.state_dir, "state.xml")
+        try:
+            # SUMO treats an unwritable state file as fatal and closes the live
+            # run, so make sure the directory is still there (e.g. tmp cleaners)
+            os.makedirs(self.state_dir, exist_ok=True)
+            live_traci.simulation.saveState(state_path)
+        except (OSError, *self.live_errors) as e:
+            print(f"[PLANNER] saveState failed, using the greedy rule: {e}")
+            return None
+
+        futures = {
+            self.pool.submit(_evaluate_plan, state_path, junction_id, plan, lanes): key
+            for key, plan in candidate_plans(candidates, self.horizon).items()
+        }
+        self._pending = list(futures)
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+        scores = {futures[f]: f.result() for f in done if f.exception() is None}
+        if not scores or len(set(scores.values())) == 1:
+            # nothing to tell the plans apart (e.g. an empty approach): the greedy rule decides
+            return None
+        first, _ = min(scores, key=scores.get)
+        return first
+
+    def shutdown(self):
+        """Stop the workers (and their SUMOs) and remove the temp state directory."""
+        # waits at most for the evaluations already running
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.owns_state_dir:
+            shutil.rmtree(self.state_dir, ignore_errors=True)
@@ -6,9 +6,11 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from openpyxl import Workbook
 
-from models import Simulation, TrafficData, db
+from models import Simulation
+from retention import traffic_rows
 
-# Lane mapping 
+# Street names for the bundled network's lanes; other lanes get a label
+# derived from the network model (see lane_label)
 LANE_LABELS = {
     "north_in_0": "Anzac Parade (Northbound - Lane 1)",
     "north_in_1": "Anzac Parade (Northbound - Lane 2)",
@@ -21,13 +23,20 @@ LANE_LABELS = {
 }
 
 
+def lane_label(lane):
+    if lane in LANE_LABELS:
+        return LANE_LABELS[lane]
+    from simulation import get_network
+    return get_network().lane_label(lane)
+
+
 def generate_simulation_pdf(sim_id: int):
     buffer = io.BytesIO()
     sim = Simulation.query.get(sim_id)
     if not sim:
         return None
 
-    rows = TrafficData.query.filter_by(simulation_id=sim_id).all()
+    rows = traffic_rows(sim_id)
 
     # Aggregate by lane
     lane_stats = {}
@@ -54,7 +63,7 @@ def generate_simulation_pdf(sim_id: int):
         avg_queue = sum(stats["queues"]) / len(stats["queues"]) if stats["queues"] else 0
         avg_speed = sum(stats["speeds"]) / len(stats["speeds"]) if stats["speeds"] else 0
         data.append([
-            LANE_LABELS.get(lane, lane),
+            lane_label(lane),
             stats["vehicles"],
             round(avg_queue, 2),
             round(avg_speed, 2),
@@ -81,7 +90,7 @@ def generate_simulation_excel(sim_id: int):
     if not sim:
         return None
 
-    rows = TrafficData.query.filter_by(simulation_id=sim_id).order_by(TrafficData.timestamp).all()
+    rows = traffic_rows(sim_id)
 
     wb = Workbook()
     ws_raw = wb.active
@@ -109,7 +118,7 @@ def generate_simulation_excel(sim_id: int):
         avg_queue = sum(stats["queues"]) / len(stats["queues"]) if stats["queues"] else 0
         avg_speed = sum(stats["speeds"]) / len(stats["speeds"]) if stats["speeds"] else 0
         ws_agg.append([
-            LANE_LABELS.get(lane, lane),
+            lane_label(lane),
             stats["vehicles"],
             round(avg_queue, 2),
             round(avg_speed, 2),
@@ -144,7 +153,7 @@ def generate_comparison_excel(sim_ids: list[int]):
         if not sim:
             continue
 
-        rows = TrafficData.query.filter_by(simulation_id=sim_id).all()
+        rows = traffic_rows(sim_id)
 
         total_vehicles = sum(r.vehicle_count for r in rows)
         avg_queue = sum(r.queue_length for r in rows) / len(rows) if rows else 0
@@ -170,7 +179,7 @@ def generate_comparison_excel(sim_ids: list[int]):
         if not sim:
             continue
 
-        rows = TrafficData.query.filter_by(simulation_id=sim_id).all()
+        rows = traffic_rows(sim_id)
         lane_stats = {}
 
         for r in rows:
@@ -186,7 +195,7 @@ def generate_comparison_excel(sim_ids: list[int]):
             avg_speed = sum(stats["speeds"]) / len(stats["speeds"]) if stats["speeds"] else 0
             ws_lane.append([
                 sim_id,
-                LANE_LABELS.get(lane, lane),
+                lane_label(lane),
                 stats["vehicles"],
                 round(avg_queue, 2),
                 round(avg_speed, 2),
@@ -0,0 +1,339 @@
+"""
+Retention of raw traffic data for ended simulations.
+
+Once a simulation has been ended for RETENTION_AGE_HOURS its TrafficData rows are
+  1. archived to a gzip CSV segment (one file per simulation) and summarised into
+     per-lane, per-minute TrafficRollup rows            -> status "archived"
+  2. deleted from traffic_data in small batches          -> status "compacted"
+
+Progress is kept in SimulationArchive (status, and the last archived row while
+archiving), so an interrupted or timed-out pass picks up where it stopped.
+Every write is a short transaction, one per batch.
+
+Readers should go through traffic_rows() / simulation_stats() / global_stats(),
+which serve archived simulations from the segment file and the rollups.
+Emergency counts come from the event store (events.py); only simulations
+recorded before it existed fall back to these rows (legacy_emergency_counts()).
+"""
+import csv
+import datetime
+import gzip
+import io
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from flask import current_app
+
+from models import db, Simulation, SimulationArchive, SignalEvent, TrafficData, TrafficRollup
+from checkpoints import delete_unpinned_checkpoints
+
+# Same attribute names as TrafficData, for code that reads either
+TrafficRow = namedtuple("TrafficRow", ["timestamp", "lane", "vehicle_count", "queue_length", "avg_speed", "emergency"])
+
+ARCHIVED_STATUSES = ("archived", "compacted")
+
+
+def archive_dir():
+    return current_app.config["RETENTION_ARCHIVE_DIR"] or os.path.join(current_app.instance_path, "archive")
+
+
+def segment_path(sim_id):
+    return os.path.join(archive_dir(), f"simulation_{sim_id}.csv.gz")
+
+
+def archived_simulation_ids():
+    return db.session.query(SimulationArchive.simulation_id).filter(SimulationArchive.status.in_(ARCHIVED_STATUSES))
+
+
+def is_archived(sim_id):
+    archive = db.session.get(SimulationArchive, sim_id)
+    return archive is not None and archive.status in ARCHIVED_STATUSES
+
+
+# --- Reading ---
+
+def read_segment(path, limit=None):
+    rows = []
+    with gzip.open(path, "rt", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # header
+        for record in reader:
+            if limit is not None and len(rows) >= limit:
+                break
+            rows.append(TrafficRow(
+                timestamp=datetime.datetime.fromisoformat(record[0]),
+                lane=record[1],
+                vehicle_count=int(record[2]),
+                queue_length=int(record[3]),
+                avg_speed=float(record[4]),
+                emergency=record[5] == "1",
+            ))
+    return rows
+
+
+def traffic_rows(sim_id, limit=None):
+    """Raw readings for a simulation ordered by time, from the DB or its archive segment."""
+    archive = db.session.get(SimulationArchive, sim_id)
+    if archive is not None and archive.status in ARCHIVED_STATUSES:
+        return read_segment(archive.path, limit)
+
+    query = TrafficData.query.filter_by(simulation_id=sim_id).order_by(TrafficData.timestamp.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [
+        TrafficRow(r.timestamp, r.lane, r.vehicle_count, r.queue_length, r.avg_speed, r.emergency)
+        for r in query
+    ]
+
+
+def simulation_stats(sim_id):
+    """(total vehicles, average queue length) for one simulation."""
+    if is_archived(sim_id):
+        vehicles, queue_sum, samples = db.session.query(
+            db.func.sum(TrafficRollup.vehicle_sum),
+            db.func.sum(TrafficRollup.queue_sum),
+            db.func.sum(TrafficRollup.samples),
+        ).filter(TrafficRollup.simulation_id == sim_id).first()
+        avg_queue = (queue_sum or 0) / samples if samples else 0
+        return int(vehicles or 0), float(avg_queue)
+
+    stats = db.session.query(
+        db.func.sum(TrafficData.vehicle_count),
+        db.func.avg(TrafficData.queue_length),
+    ).filter(TrafficData.simulation_id == sim_id).first()
+    return int(stats[0] or 0), float(stats[1] or 0)
+
+
+def global_stats():
+    """(total vehicles, average queue length) across all simulations."""
+    archived = archived_simulation_ids()
+    raw_vehicles, raw_queue_sum, raw_samples = db.session.query(
+        db.func.sum(TrafficData.vehicle_count),
+        db.func.sum(TrafficData.queue_length),
+        db.func.count(),
+    ).filter(~TrafficData.simulation_id.in_(archived)).first()
+    rolled_vehicles, rolled_queue_sum, rolled_samples = db.session.query(
+        db.func.sum(TrafficRollup.vehicle_sum),
+        db.func.sum(TrafficRollup.queue_sum),
+        db.func.sum(TrafficRollup.samples),
+    ).filter(TrafficRollup.simulation_id.in_(archived)).first()
+
+    samples = (raw_samples or 0) + (rolled_samples or 0)
+    queue_sum = (raw_queue_sum or 0) + (rolled_queue_sum or 0)
+    return (
+        int((raw_vehicles or 0) + (rolled_vehicles or 0)),
+        float(queue_sum / samples) if samples else 0.0,
+    )
+
+
+def legacy_emergency_counts(sim_ids=None):
+    """
+    {simulation_id: emergency readings} for simulations without any signal
+    events, i.e. recorded before the event store: the readings flagged
+    emergency, from the raw rows or the rollups. Only the given simulations
+    when sim_ids is set; simulations with no such readings are left out.
+    """
+    legacy = db.session.query(Simulation.id).filter(
+        ~Simulation.id.in_(db.session.query(SignalEvent.simulation_id).distinct())
+    )
+    if sim_ids is not None:
+        legacy = legacy.filter(Simulation.id.in_(sim_ids))
+    archived = archived_simulation_ids()
+
+    raw = (db.session.query(TrafficData.simulation_id, db.func.count())
+           .filter(TrafficData.simulation_id.in_(legacy), ~TrafficData.simulation_id.in_(archived),
+                   TrafficData.emergency == True)
+           .group_by(TrafficData.simulation_id))
+    rolled = (db.session.query(TrafficRollup.simulation_id, db.func.sum(TrafficRollup.emergency_samples))
+              .filter(TrafficRollup.simulation_id.in_(legacy), TrafficRollup.simulation_id.in_(archived))
+              .group_by(TrafficRollup.simulation_id))
+    counts = {}
+    for query in (raw, rolled):
+        for sim_id, count in query:
+            if count:
+                counts[sim_id] = int(count)
+    return counts
+
+
+# --- Compaction job ---
+
+def due_simulations(limit):
+    """Ended simulations older than the retention age that are not compacted yet."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=current_app.config["RETENTION_AGE_HOURS"])
+    compacted = db.session.query(SimulationArchive.simulation_id).filter(SimulationArchive.status == "compacted")
+    return [
+        s.id for s in Simulation.query
+        .filter(Simulation.end_time != None, Simulation.end_time <= cutoff, ~Simulation.id.in_(compacted))
+        .order_by(Simulation.id.asc())
+        .limit(limit)
+    ]
+
+
+def write_segment_batch(path, batch, header=False):
+    """Append one gzip member holding `batch` to the segment; returns the new file size."""
+    with gzip.open(path, "ab") as raw, io.TextIOWrapper(raw, newline="") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(TrafficRow._fields)
+        for r in batch:
+            writer.writerow([r.timestamp.isoformat(), r.lane, r.vehicle_count, r.queue_length,
+                             r.avg_speed, 1 if r.emergency else 0])
+    with open(path, "ab") as f:
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def add_rollups(sim_id, batch):
+    """Fold a batch of TrafficData rows into the simulation's per-lane, per-minute rollups."""
+    buckets = {}
+    for r in batch:
+        buckets.setdefault((r.lane, r.timestamp.replace(second=0, microsecond=0)), []).append(r)
+    # rows come in id (so time) order: only the latest buckets can exist already
+    existing = {
+        (rollup.lane, rollup.bucket_start): rollup
+        for rollup in TrafficRollup.query.filter(
+            TrafficRollup.simulation_id == sim_id,
+            TrafficRollup.bucket_start >= min(bucket_start for _, bucket_start in buckets),
+        )
+    }
+    for (lane, bucket_start), rows in buckets.items():
+        rollup = existing.get((lane, bucket_start))
+        if rollup is None:
+            rollup = TrafficRollup(simulation_id=sim_id, lane=lane, bucket_start=bucket_start, samples=0,
+                                   vehicle_sum=0, queue_sum=0, queue_max=0, speed_sum=0.0, emergency_samples=0)
+            db.session.add(rollup)
+        rollup.samples += len(rows)
+        rollup.vehicle_sum += sum(r.vehicle_count for r in rows)
+        rollup.queue_sum += sum(r.queue_length for r in rows)
+        rollup.queue_max = max(rollup.queue_max, *(r.queue_length for r in rows))
+        rollup.speed_sum += sum(r.avg_speed for r in rows)
+        rollup.emergency_samples += sum(1 for r in rows if r.emergency)
+
+
+def archive_simulation(sim_id, deadline):
+    """
+    Write the gzip segment and rollups for a simulation, one batch per
+    transaction, until done or past `deadline` (time.monotonic()). Returns True
+    once the simulation is in status "archived".
+
+    Each batch appends a gzip member to the segment, then commits its rollups
+    together with the archive's last_id cursor and segment size. An
+    interrupted run truncates the segment back to the committed size and
+    carries on after last_id.
+    """
+    batch_size = current_app.config["RETENTION_BATCH_SIZE"]
+    path = segment_path(sim_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    archive = db.session.get(SimulationArchive, sim_id)
+
+    if archive.last_id and os.path.exists(path) and os.path.getsize(path) >= archive.segment_size:
+        # drop whatever an interrupted batch appended after its last commit
+        os.truncate(path, archive.segment_size)
+    elif archive.last_id or archive.segment_size or archive.row_count:
+        # the segment is gone (or shorter than committed): start over
+        print(f"[RETENTION] Segment of simulation id={sim_id} is missing or short, re-archiving")
+        archive.last_id = archive.segment_size = archive.row_count = 0
+    if not archive.last_id:
+        # rollups left by an earlier attempt (or an earlier release's single-pass archiver)
+        TrafficRollup.query.filter_by(simulation_id=sim_id).delete()
+        db.session.commit()
+        for stale in (path, path + ".tmp"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    while True:
+        batch = (TrafficData.query
+                 .filter(TrafficData.simulation_id == sim_id, TrafficData.id > archive.last_id)
+                 .order_by(TrafficData.id.asc())
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+        size = write_segment_batch(path, batch, header=not archive.last_id)
+        add_rollups(sim_id, batch)
+        archive.last_id = batch[-1].id
+        archive.segment_size = size
+        archive.row_count += len(batch)
+        db.session.commit()
+        if time.monotonic() >= deadline:
+            print(f"[RETENTION] Out of time archiving simulation id={sim_id} at {archive.row_count} rows")
+            return False
+
+    if not archive.last_id:
+        # nothing recorded; still give readers a valid (empty) segment
+        archive.segment_size = write_segment_batch(path, [], header=True)
+    archive.status = "archived"
+    archive.path = path
+    archive.archived_at = datetime.datetime.utcnow()
+    db.session.commit()
+    # an archived simulation can't be resumed; only pinned checkpoints stay useful
+    delete_unpinned_checkpoints(sim_id)
+    print(f"[RETENTION] Archived simulation id={sim_id}: {archive.row_count} rows -> {path}")
+    return True
+
+
+def purge_raw_rows(sim_id, deadline):
+    """Delete archived raw rows in small batches. Returns True once none are left."""
+    batch_size = current_app.config["RETENTION_BATCH_SIZE"]
+    pause = current_app.config["RETENTION_BATCH_PAUSE"]
+    while time.monotonic() < deadline:
+        ids = [i for (i,) in db.session.query(TrafficData.id)
+               .filter(TrafficData.simulation_id == sim_id)
+               .limit(batch_size)]
+        if not ids:
+            archive = db.session.get(SimulationArchive, sim_id)
+            archive.status = "compacted"
+            db.session.commit()
+            print(f"[RETENTION] Compacted simulation id={sim_id}")
+            return True
+        TrafficData.query.filter(TrafficData.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        time.sleep(pause)
+    return False
+
+
+def run_retention_pass(max_seconds=None):
+    """
+    Process due simulations until done or out of time. Safe to interrupt at any
+    point and to call repeatedly. Returns the number of simulations compacted.
+    """
+    if max_seconds is None:
+        max_seconds = current_app.config["RETENTION_PASS_SECONDS"]
+    deadline = time.monotonic() + max_seconds
+    compacted = 0
+
+    for sim_id in due_simulations(limit=current_app.config["RETENTION_MAX_SIMULATIONS"]):
+        if time.monotonic() >= deadline:
+            break
+        archive = db.session.get(SimulationArchive, sim_id)
+        if archive is None:
+            archive = SimulationArchive(simulation_id=sim_id, status="archiving")
+            db.session.add(archive)
+            db.session.commit()
+        if archive.status == "archiving" and not archive_simulation(sim_id, deadline):
+            break
+        if purge_raw_rows(sim_id, deadline):
+            compacted += 1
+    return compacted
+
+
+def start_retention_worker(app):
+    """Run retention passes periodically in a daemon thread (only one process should do this)."""
+    if not app.config["RETENTION_ENABLED"]:
+        return None
+
+    def loop():
+        while True:
+            try:
+                with app.app_context():
+                    run_retention_pass()
+            except Exception as e:
+                print(f"[RETENTION] Pass failed: {e}\n{traceback.format_exc()}")
+            time.sleep(app.config["RETENTION_INTERVAL_SECONDS"])
+
+    thread = threading.Thread(target=loop, name="stms-retention", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,291 @@
+import atexit
+import datetime
+
+from flask import current_app
+
+import events
+import simulation
+from simulation import close_simulation, get_network, simulate_sensors, start_simulation, set_all_signals, sumo_config_path
+from models import db, Simulation, SimulationCheckpoint
+from db_engine import bulk_insert_traffic
+from checkpoints import delete_unpinned_checkpoints, discard_after, latest_checkpoint, restore_controller, save_checkpoint
+
+# Simulation lifecycle state. In development this lives in the Flask process;
+# in the shared serving mode it lives only in the owner process (see serving.py).
+# Every function here expects to be called inside an app context.
+traci = None
+sensor_generator = None
+current_simulation_id = None
+current_window = {"size": 1, "mode": "step"}
+last_checkpoint_time = 0.0  # simulation time of the last checkpoint
+
+NOT_RUNNING = {"simulation_running": False, "message": "No active simulation"}
+ENDED = {"simulation_running": False, "message": "Simulation ended"}
+
+
+def launch(window=1, jump=False, checkpoint=None):
+    """
+    Closes any existing SUMO connection and starts a new one, from
+    `checkpoint` (a SimulationCheckpoint) when given.
+    window > 1 emits one aggregated snapshot per `window` steps (see
+    simulation.simulate_windowed_sensors).
+    """
+    global traci, sensor_generator, current_window
+
+    try:
+        if traci:
+            try:
+                close_simulation()
+            except Exception:
+                # ignore any close errors
+                pass
+            traci = None
+    except Exception:
+        pass
+
+    traci = start_simulation(current_app.config["SIM_BACKEND"], checkpoint.state_path if checkpoint else None)
+    if not traci:
+        return False
+
+    if current_app.config["PLANNER_ENABLED"] and simulation.planner is None:
+        simulation.enable_planner(create_planner(current_app.config))
+    simulation.reset_controller_state()
+    if checkpoint is not None:
+        restore_controller(traci, checkpoint)
+    simulation.set_event_sink(events.record)
+
+    sensor_generator = simulate_sensors(window=window, jump=jump)
+    current_window = {"size": window, "mode": "step" if window == 1 else ("jump" if jump else "accumulate")}
+    return True
+
+
+def restart_simulation(window=1, jump=False, checkpoint_id=None):
+    """
+    Starts a new simulation (see launch()), from t=0 or warm from the
+    checkpoint `checkpoint_id` (of any simulation). Also creates a Simulation
+    DB row and stores current_simulation_id.
+    """
+    global current_simulation_id, last_checkpoint_time
+
+    checkpoint = None
+    if checkpoint_id is not None:
+        checkpoint = db.session.get(SimulationCheckpoint, checkpoint_id)
+        if checkpoint is None:
+            return False
+    if not launch(window, jump, checkpoint):
+        return False
+
+    # Create a simulation record in DB
+    sim = Simulation(start_time=datetime.datetime.utcnow())
+    db.session.add(sim)
+    db.session.commit()
+    current_simulation_id = sim.id
+    last_checkpoint_time = traci.simulation.getTime()
+    events.begin_simulation(current_app._get_current_object(), sim.id)
+    if checkpoint is not None:
+        print(f"Started new simulation id={current_simulation_id} from checkpoint {checkpoint.id} (t={checkpoint.sim_time}s)")
+    else:
+        print(f"Started new simulation id={current_simulation_id}")
+
+    return True
+
+
+def resume_simulation(simulation_id):
+    """
+    Continue `simulation_id` from its latest checkpoint, e.g. after a crash or
+    a deploy. What it recorded after that checkpoint is discarded. Ends the
+    current simulation first.
+    """
+    global current_simulation_id, last_checkpoint_time
+
+    end_current_simulation(keep_checkpoints=current_simulation_id == simulation_id)
+    checkpoint = latest_checkpoint(simulation_id)
+    if checkpoint is None:
+        return False
+    if not launch(checkpoint.window_size, checkpoint.window_mode == "jump", checkpoint):
+        return False
+
+    # reopen and bump the generation in the same commit as the deletes, so no
+    # data version is ever seen twice for different rows (see app.traffic_version)
+    sim = db.session.get(Simulation, simulation_id)
+    sim.end_time = None
+    sim.generation += 1
+    discard_after(checkpoint)
+    current_simulation_id = simulation_id
+    last_checkpoint_time = checkpoint.sim_time
+    events.begin_simulation(current_app._get_current_object(), simulation_id)
+    print(f"Resumed simulation id={simulation_id} from checkpoint {checkpoint.id} (t={checkpoint.sim_time}s)")
+    return True
+
+
+def take_checkpoint(pinned=False):
+    """Checkpoint the running simulation now; returns the SimulationCheckpoint or None."""
+    global last_checkpoint_time
+    if current_simulation_id is None or not is_running():
+        return None
+    events.flush()
+    checkpoint = save_checkpoint(traci, current_simulation_id, current_window, pinned=pinned)
+    last_checkpoint_time = checkpoint.sim_time
+    return checkpoint
+
+
+def checkpoint_if_due():
+    interval = current_app.config["CHECKPOINT_INTERVAL"]
+    if interval > 0 and traci.simulation.getTime() - last_checkpoint_time >= interval:
+        try:
+            take_checkpoint()
+        except Exception as e:
+            # a missed checkpoint must not stop the simulation
+            db.session.rollback()
+            print(f"Checkpoint of simulation id={current_simulation_id} failed: {e}")
+
+
+def create_planner(config):
+    from planner import LookaheadPlanner
+    # in-process mode has no teardown hook of its own
+    atexit.register(shutdown_planner)
+    return LookaheadPlanner(
+        config_path=sumo_config_path(),
+        workers=config["PLANNER_WORKERS"],
+        horizon=config["PLANNER_HORIZON"],
+        budget_ms=config["PLANNER_BUDGET_MS"],
+        state_dir=config["PLANNER_STATE_DIR"],
+        backend_name=config["SIM_BACKEND"],
+    )
+
+
+def shutdown_planner():
+    """Stop the lookahead planner's worker pool, if one was started. Safe to call twice."""
+    if simulation.planner is not None:
+        planner, simulation.planner = simulation.planner, None
+        planner.shutdown()
+
+
+def end_current_simulation(keep_checkpoints=False):
+    """
+    Set end_time for current simulation in DB and drop its periodic
+    checkpoints. keep_checkpoints=True keeps them so the simulation can be
+    resumed (used when the owner process shuts down for a restart or deploy).
+    """
+    global current_simulation_id
+    if current_simulation_id is not None:
+        # its events must be in before it counts as ended (see events.py)
+        events.end_simulation()
+        sim = Simulation.query.get(current_simulation_id)
+        if sim and sim.end_time is None:
+            sim.end_time = datetime.datetime.utcnow()
+            db.session.commit()
+            print(f"Marked simulation id={current_simulation_id} ended at {sim.end_time}")
+        if not keep_checkpoints:
+            delete_unpinned_checkpoints(current_simulation_id)
+    current_simulation_id = None
+
+
+def store_sensor_readings(sensors):
+    """
+    sensors returned from simulate_sensors() contains:
+      - per-lane counts (sensors['north_in_0'], etc.)
+      - sensors['queue_length'][lane]
+      - sensors['avg_speed'][lane]
+      - sensors['emergency']
+    We'll insert a row per lane with the current simulation id.
+    """
+    if current_simulation_id is None:
+        return
+
+    timestamp = datetime.datetime.utcnow()
+    net = get_network()
+    lane_keys = [net.lane_ids[i] for i in net.sensed_lanes if net.lane_ids[i] in sensors]
+
+    emergency = bool(sensors.get("emergency", False))
+    rows = []
+    for lane in lane_keys:
+        try:
+            vehicle_count = int(round(float(sensors.get(lane, 0))))
+        except Exception:
+            vehicle_count = 0
+        try:
+            queue_length = int(round(float(sensors.get("queue_length", {}).get(lane, 0))))
+        except Exception:
+            queue_length = 0
+        try:
+            avg_speed = float(sensors.get("avg_speed", {}).get(lane, 0.0))
+        except Exception:
+            avg_speed = 0.0
+
+        rows.append({
+            "simulation_id": current_simulation_id,
+            "timestamp": timestamp,
+            "lane": lane,
+            "vehicle_count": vehicle_count,
+            "queue_length": queue_length,
+            "avg_speed": avg_speed,
+            "emergency": emergency,
+        })
+    if rows:
+        bulk_insert_traffic(rows)
+        db.session.commit()
+
+
+def is_running():
+    """True while a SUMO connection exists and still has vehicles to simulate."""
+    return bool(traci) and traci.simulation.getMinExpectedNumber() > 0
+
+
+def advance():
+    """
+    Step the simulation once, store the readings and return the /api/sensors
+    payload. Marks the simulation ended when SUMO has nothing left to do.
+    """
+    global traci
+    if not is_running():
+        end_current_simulation()
+        return dict(NOT_RUNNING)
+
+    try:
+        sensors = next(sensor_generator)
+    except StopIteration:
+        # simulate_sensors() closes the connection when SUMO runs dry
+        traci = None
+        end_current_simulation()
+        return dict(ENDED)
+
+    store_sensor_readings(sensors)
+    checkpoint_if_due()
+    payload = dict(sensors)
+    payload["simulation_id"] = current_simulation_id
+    payload["simulation_running"] = True
+    return payload
+
+
+def apply_signal(data):
+    """Apply a /api/signal request body and return the response payload."""
+    global traci
+    if not is_running():
+        end_current_simulation()
+        return dict(NOT_RUNNING)
+
+    mode = data.get("mode", "auto")
+    sensors = {"mode": mode}
+
+    if mode == "manual":
+        sensors["lane"] = data.get("lane")
+        sensors["state"] = data.get("state")
+        sensors["emergency"] = False
+        sensors["emergency_lane"] = None
+    else:
+        try:
+            sensors.update(next(sensor_generator))  # reuse current sensor data
+        except StopIteration:
+            traci = None
+            end_current_simulation()
+            return dict(ENDED)
+
+    set_all_signals(traci, sensors)
+
+    return {
+        "status": "Signal updated",
+        "mode": mode,
+        "simulation_running": True,
+        "simulation_id": current_simulation_id
+    }
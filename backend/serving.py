@@ -0,0 +1,379 @@
+"""
+Production serving mode.
+
+SUMO is a single stateful process, so it cannot live inside every WSGI worker.
+Instead one owner process runs the simulation (runtime.py) and publishes the
+latest /api/sensors payload into a shared-memory segment. Web workers read that
+segment directly and forward control commands (start/end/signal) to the owner
+over a local socket.
+
+Snapshot segment layout (little endian):
+    [0:8)   sequence number, odd while the owner is writing
+    [8:12)  payload length
+    [16:24) heartbeat: time.time() of the owner loop's latest iteration
+    [24:)   JSON payload
+
+The owner refreshes the heartbeat on every loop iteration, running or idle.
+Workers treat a snapshot whose heartbeat is older than SIM_OWNER_STALE_SECONDS
+as no snapshot (503), since the owner is dead or stuck; gunicorn.conf.py
+restarts an owner that has exited (supervise_owner()).
+"""
+import json
+import os
+import queue
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+HEADER_SIZE = 24
+_SEQ = struct.Struct("<Q")
+_LEN = struct.Struct("<I")
+_BEAT = struct.Struct("<d")
+
+
+class SnapshotBuffer:
+    """Single-writer, many-reader snapshot slot guarded by a seqlock."""
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.capacity = shm.size - HEADER_SIZE
+        self._seq = 0
+        self._last_seq = None
+        self._last_payload = None
+
+    @classmethod
+    def create(cls, name, size):
+        try:
+            # Left over from an owner that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _SEQ.pack_into(shm.buf, 0, 0)
+        _LEN.pack_into(shm.buf, 8, 0)
+        _BEAT.pack_into(shm.buf, 16, 0.0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13: stop the resource tracker from unlinking the
+            # owner's segment when this worker exits.
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    def publish(self, payload):
+        """Write a new snapshot (bytes). Only the owner process calls this."""
+        size = len(payload)
+        if size > self.capacity:
+            raise ValueError(f"snapshot of {size} bytes exceeds segment capacity {self.capacity}")
+        buf = self.shm.buf
+        _SEQ.pack_into(buf, 0, self._seq + 1)
+        buf[HEADER_SIZE:HEADER_SIZE + size] = payload
+        _LEN.pack_into(buf, 8, size)
+        self._seq += 2
+        _SEQ.pack_into(buf, 0, self._seq)
+        self.beat()
+
+    def beat(self):
+        """Record that the owner is alive. Only the owner process calls this."""
+        _BEAT.pack_into(self.shm.buf, 16, time.time())
+
+    def heartbeat(self):
+        """time.time() of the owner's latest beat, 0.0 if it never beat."""
+        buf = self.shm.buf
+        # not covered by the seqlock: read until two reads agree
+        while True:
+            (first,) = _BEAT.unpack_from(buf, 16)
+            (second,) = _BEAT.unpack_from(buf, 16)
+            if first == second:
+                return first
+
+    def read(self, retries=1000):
+        """Return (sequence, payload bytes) of the latest consistent snapshot, or None."""
+        buf = self.shm.buf
+        for _ in range(retries):
+            (seq,) = _SEQ.unpack_from(buf, 0)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            if seq == self._last_seq:
+                return seq, self._last_payload
+            (size,) = _LEN.unpack_from(buf, 8)
+            payload = bytes(buf[HEADER_SIZE:HEADER_SIZE + size])
+            if _SEQ.unpack_from(buf, 0)[0] == seq:
+                if seq == 0:
+                    return None
+                self._last_seq, self._last_payload = seq, payload
+                return seq, payload
+        return None
+
+    def close(self):
+        if self.owner:
+            # workers still attached to this segment see the owner gone at once
+            _BEAT.pack_into(self.shm.buf, 16, 0.0)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is treated as a unix socket path."""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+# Control messages are JSON, never pickle: Connection.recv() would unpickle
+# (and so run) whatever an authenticated client sends.
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+
+def send_message(conn, message):
+    conn.send_bytes(json.dumps(message).encode())
+
+
+def recv_message(conn):
+    """Next JSON object from the connection; ValueError if it is anything else."""
+    message = json.loads(conn.recv_bytes(MAX_MESSAGE_BYTES))
+    if not isinstance(message, dict):
+        raise ValueError("control message must be a JSON object")
+    return message
+
+
+def _authkey(config):
+    return (config.get("SIM_CONTROL_AUTHKEY") or config["JWT_SECRET_KEY"]).encode()
+
+
+class SimulationClient:
+    """Used by web workers: reads snapshots, forwards commands to the owner."""
+
+    def __init__(self, config):
+        self.shm_name = config["SIM_SNAPSHOT_SHM"]
+        self.address = parse_address(config["SIM_CONTROL_ADDRESS"])
+        self.authkey = _authkey(config)
+        self.timeout = config["SIM_CONTROL_TIMEOUT"]
+        self.stale_after = config["SIM_OWNER_STALE_SECONDS"]
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """
+        Latest /api/sensors payload as JSON bytes, or None if the owner is not
+        up or its heartbeat is stale.
+        """
+        with self._lock:
+            if self._buffer is None:
+                try:
+                    self._buffer = SnapshotBuffer.attach(self.shm_name)
+                except FileNotFoundError:
+                    return None
+            if time.time() - self._buffer.heartbeat() > self.stale_after:
+                # a restarted owner creates a new segment; attach again next time
+                self._buffer.close()
+                self._buffer = None
+                return None
+            latest = self._buffer.read()
+        return latest[1] if latest else None
+
+    def send(self, command, **params):
+        """Forward a control command and wait for the owner's reply dict."""
+        message = {"command": command, **params}
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+        except OSError:
+            return None
+        try:
+            send_message(conn, message)
+            if not conn.poll(self.timeout):
+                return None
+            return recv_message(conn)
+        except (EOFError, OSError, ValueError):
+            return None
+        finally:
+            conn.close()
+
+
+def _serve_connections(listener, commands):
+    """Accept control connections and queue their messages for the owner loop."""
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            return
+        except Exception as e:
+            # e.g. a client with the wrong authkey
+            print(f"[SERVING] Rejected control connection: {e}")
+            continue
+
+        def reader(conn=conn):
+            try:
+                while True:
+                    commands.put((recv_message(conn), conn))
+            except (EOFError, OSError):
+                pass
+            except ValueError as e:
+                print(f"[SERVING] Dropped control connection with a malformed message: {e}")
+                conn.close()
+
+        threading.Thread(target=reader, daemon=True).start()
+
+
+def _dispatch(runtime, message):
+    command = message.get("command")
+    if command == "start":
+        runtime.end_current_simulation()
+        ok = runtime.restart_simulation(window=message.get("window", 1), jump=message.get("jump", False),
+                                        checkpoint_id=message.get("checkpoint_id"))
+        return {"ok": ok, "id": runtime.current_simulation_id, "window": runtime.current_window}
+    if command == "resume":
+        ok = runtime.resume_simulation(message["simulation_id"])
+        return {"ok": ok, "id": runtime.current_simulation_id, "window": runtime.current_window}
+    if command == "checkpoint":
+        from checkpoints import checkpoint_dict
+        checkpoint = runtime.take_checkpoint(pinned=True)
+        return {"ok": checkpoint is not None, "checkpoint": checkpoint_dict(checkpoint) if checkpoint else None}
+    if command == "end":
+        runtime.end_current_simulation()
+        return {"ok": True}
+    if command == "signal":
+        return runtime.apply_signal(message.get("data") or {})
+    return {"error": f"Unknown command {command!r}"}
+
+
+def run_owner():
+    """Main loop of the simulation owner process."""
+    from app import create_app
+    from retention import start_retention_worker
+    import runtime
+
+    app = create_app()
+    # one retention worker per deployment: it runs here, not in the web workers
+    start_retention_worker(app)
+    config = app.config
+    interval = config["SIM_STEP_INTERVAL"]
+    buffer = SnapshotBuffer.create(config["SIM_SNAPSHOT_SHM"], config["SIM_SNAPSHOT_SIZE"])
+    listener = Listener(parse_address(config["SIM_CONTROL_ADDRESS"]), authkey=_authkey(config))
+    commands = queue.Queue()
+    threading.Thread(target=_serve_connections, args=(listener, commands), daemon=True).start()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    def publish(payload):
+        try:
+            buffer.publish(json.dumps(payload).encode())
+        except ValueError as e:
+            print(f"[SERVING] Dropped snapshot: {e}")
+
+    print(f"[SERVING] Simulation owner pid={os.getpid()} listening on {config['SIM_CONTROL_ADDRESS']}")
+    with app.app_context():
+        publish(runtime.NOT_RUNNING)
+        next_tick = time.monotonic()
+        try:
+            while not stopping.is_set():
+                buffer.beat()
+                try:
+                    message, conn = commands.get(timeout=max(0.0, next_tick - time.monotonic()))
+                except queue.Empty:
+                    message = None
+
+                if message is not None:
+                    try:
+                        reply = _dispatch(runtime, message)
+                    except Exception as e:
+                        print(f"[SERVING] Command {message!r} failed: {e}\n{traceback.format_exc()}")
+                        reply = {"error": "Internal server error"}
+                    try:
+                        send_message(conn, reply)
+                    except OSError:
+                        pass
+                    if message.get("command") in ("start", "resume", "end"):
+                        next_tick = time.monotonic()
+                        if runtime.current_simulation_id is None:
+                            publish(runtime.NOT_RUNNING)
+
+                if time.monotonic() >= next_tick:
+                    next_tick += interval
+                    if runtime.current_simulation_id is None:
+                        continue
+                    try:
+                        publish(runtime.advance())
+                    except Exception as e:
+                        print(f"[SERVING] Step failed: {e}\n{traceback.format_exc()}")
+                        # keep its checkpoints so it can be resumed
+                        runtime.end_current_simulation(keep_checkpoints=True)
+                        publish(runtime.NOT_RUNNING)
+                    # Don't try to catch up after a slow step or a long command
+                    next_tick = max(next_tick, time.monotonic())
+        finally:
+            # lets the simulation be resumed after a restart or deploy
+            try:
+                runtime.take_checkpoint()
+            except Exception as e:
+                print(f"[SERVING] Shutdown checkpoint failed: {e}")
+            runtime.end_current_simulation(keep_checkpoints=True)
+            runtime.shutdown_planner()
+            listener.close()
+            buffer.close()
+            print("[SERVING] Simulation owner stopped")
+
+
+def start_owner_process():
+    """
+    Start the owner process (this module as a script); used by gunicorn.conf.py.
+    A plain subprocess rather than a multiprocessing child: the web workers fork
+    from the master afterwards and must not inherit it as their own child.
+    """
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)])
+
+
+def supervise_owner(server, interval=5.0):
+    """
+    Restart the owner process whenever it exits. Runs in a daemon thread of the
+    gunicorn master, which keeps the current process in server.sim_owner (see
+    gunicorn.conf.py). Returns an Event that stops the supervision when set.
+    """
+    stopping = threading.Event()
+
+    def loop():
+        while not stopping.wait(interval):
+            process = server.sim_owner
+            if process is not None and process.poll() is not None:
+                # no exit code: gunicorn's SIGCHLD handler may have reaped it already
+                print(f"[SERVING] Simulation owner pid={process.pid} exited, restarting")
+                server.sim_owner = start_owner_process()
+
+    threading.Thread(target=loop, name="stms-owner-supervisor", daemon=True).start()
+    return stopping
+
+
+def stop_owner_process(process, timeout=10):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+if __name__ == "__main__":
+    # Run the owner on its own, e.g. under a separate supervisor.
+    run_owner()
@@ -1,87 +1,265 @@
 import traci
+import traci.constants as tc
 import os
 import random
 
-def start_simulation():
+from network import load_network
+from sumo_backend import get_backend
+
+# Lane variables read every step, through one subscription per lane
+LANE_VARIABLES = (tc.LAST_STEP_VEHICLE_NUMBER, tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.LAST_STEP_MEAN_SPEED)
+
+
+def sumo_config_path():
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "../sumo/network.sumocfg"))
+
+
+# Backend the running simulation was started with (sumo_backend.py)
+backend = None
+
+
+# Lets saveState() files (checkpoints.py) restore a run exactly
+STATE_OPTIONS = ["--save-state.rng", "true", "--save-state.precision", "8"]
+
+
+def start_simulation(backend_name="traci", state_file=None):
+    """
+    Start SUMO on the chosen backend and return its API object (the traci
+    module, or libsumo). The module-level `traci` used by the sensing code is
+    rebound to it, so everything below runs against whichever backend started.
+    state_file: a saved state to start from instead of t=0.
+    """
+    global traci, backend
+    config_path = sumo_config_path()
+    if not os.path.exists(config_path):
+        print(f"Error: SUMO config file not found at {config_path}")
+        return None
+    sumo_cmd = ["sumo", "-c", config_path] + STATE_OPTIONS
+    if state_file:
+        # unlike simulation.loadState(), this also skips the route file up to the state's time
+        sumo_cmd += ["--load-state", state_file]
+    backend = get_backend(backend_name)
     try:
-        config_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../sumo/network.sumocfg"))
-        if not os.path.exists(config_path):
-            print(f"Error: SUMO config file not found at {config_path}")
-            return None
-        traci.start(["sumo", "-c", config_path])
-        print("SUMO simulation started successfully")
+        traci = backend.start(sumo_cmd)
+        print(f"SUMO simulation started successfully ({backend.name} backend)")
         return traci
-    except traci.exceptions.TraCIException as e:
+    except backend.errors as e:
         print(f"Failed to start SUMO: {e}")
         return None
 
 
-def set_signal_state(traci, junction_id, sensors):
-    if not traci:
-        return
+def close_simulation():
+    """Close the running simulation, whichever backend it is on."""
+    if backend is not None:
+        backend.close()
+
+
+# Network model (network.py), loaded on first use
+network = None
+
+# Optional planner.LookaheadPlanner used by the auto mode (see enable_planner)
+planner = None
+
+# Sensor noise has its own generator so checkpoints can save and restore it
+noise_rng = random.Random()
+
+# Optional callable(kind, junction_id, sim_time, **fields) receiving controller
+# events (see set_event_sink; events.record in the app). Must not block.
+event_sink = None
+
+
+def get_network():
+    global network
+    if network is None:
+        network = load_network(sumo_config_path())
+    return network
+
+
+def enable_planner(lookahead_planner):
+    global planner
+    planner = lookahead_planner
 
-    NORTH_SOUTH_GREEN = "GGGggrrrrrGGGggrrrrr"
-    EAST_WEST_GREEN = "rrrrrGGGggrrrrrGGGgg"
-    YELLOW_TRANSITION = "yyyyyrrrrryyyyyrrrrr"
-    ALL_RED = "rrrrrrrrrrrrrrrrrrrr"
 
-    if not hasattr(set_signal_state, "last_green"):
-        set_signal_state.last_green = None
-        set_signal_state.green_start_time = 0
+def set_event_sink(sink):
+    global event_sink
+    event_sink = sink
+
+
+def emit_event(kind, junction_id, sim_time, **fields):
+    if event_sink is not None:
+        event_sink(kind, junction_id, sim_time, **fields)
+
+
+def reset_controller_state():
+    """Forget per-junction controller state, e.g. when a new simulation starts."""
+    init_controller()
+    set_signal_state.junctions.clear()
+    emergency_in_network.cached = None
+
+
+def export_controller_state(traci):
+    """
+    JSON-serializable controller state for a checkpoint: per-junction state,
+    the lights currently shown (online states are not in SUMO's saved state)
+    and the noise RNG.
+    """
+    init_controller()
+    version, internal, gauss_next = noise_rng.getstate()
+    return {
+        "junctions": {j: dict(state) for j, state in set_signal_state.junctions.items()},
+        "lights": {j: traci.trafficlight.getRedYellowGreenState(j) for j in get_network().junctions},
+        "noise_rng": [version, list(internal), gauss_next],
+    }
+
+
+def import_controller_state(traci, saved):
+    """Restore export_controller_state() output, after SUMO has loaded the matching state."""
+    reset_controller_state()
+    init_controller()
+    for junction_id, state in saved["junctions"].items():
+        set_signal_state.junctions[junction_id] = {**new_junction_state(), **state}
+    for junction_id, lights in saved["lights"].items():
+        traci.trafficlight.setRedYellowGreenState(junction_id, lights)
+    version, internal, gauss_next = saved["noise_rng"]
+    noise_rng.setstate((version, tuple(internal), gauss_next))
+
+
+def new_junction_state():
+    return {
+        "last_green": None,
+        "green_start_time": 0,
+        "emergency_active": False,
+        "emergency_direction": None,
+        "emergency_lane": None,
+        "emergency_start_time": 0,
+        "clearance_active": False,
+        "clearance_start_time": 0,
+    }
+
+
+def emergency_in_network(traci, current_time):
+    """Any emergency vehicle left in the network; checked once per simulation time."""
+    cached = getattr(emergency_in_network, "cached", None)
+    if cached is None or cached[0] != current_time:
+        present = any(traci.vehicle.getVehicleClass(v) == "emergency" for v in traci.vehicle.getIDList())
+        cached = emergency_in_network.cached = (current_time, present)
+    return cached[1]
+
+
+def init_controller():
+    if not hasattr(set_signal_state, "junctions"):
+        set_signal_state.junctions = {}
         set_signal_state.min_green_time = 10
-        set_signal_state.emergency_active = False
-        set_signal_state.emergency_direction = None
-        set_signal_state.clearance_active = False
-        set_signal_state.clearance_start_time = 0
         set_signal_state.clearance_duration = 3
 
-    current_time = traci.simulation.getTime()
+
+def set_signal_state(traci, junction_id, sensors, current_time=None):
+    """
+    Run the controller for one junction. current_time is the simulation time
+    when the caller already has it (set_all_signals reads it once per step).
+    """
+    if not traci:
+        return
+
+    net = get_network()
+    junction = net.junctions[junction_id]
+    lane_ids = net.lane_ids
+
+    init_controller()
+    state = set_signal_state.junctions.setdefault(junction_id, new_junction_state())
+
+    if current_time is None:
+        current_time = traci.simulation.getTime()
+
+    # Emergencies only preempt the junction the vehicle is approaching
+    emergency_lane = net.lane_index.get(sensors.get("emergency_lane"))
+    emergency_here = bool(sensors.get("emergency")) and emergency_lane in junction.lanes
 
     # --- Emergency Priority ---
-    if sensors.get("emergency") or set_signal_state.emergency_active:
-        if sensors.get("emergency"):
-            if not set_signal_state.emergency_active:
-                print(f"[EVENT] Emergency detected at t={current_time}s, lane={sensors['emergency_lane']}")
-            set_signal_state.emergency_active = True
-            if "north_in" in sensors["emergency_lane"] or "south_in" in sensors["emergency_lane"]:
-                traci.trafficlight.setRedYellowGreenState(junction_id, NORTH_SOUTH_GREEN)
-                set_signal_state.emergency_direction = "north_south"
-            elif "east_in" in sensors["emergency_lane"] or "west_in" in sensors["emergency_lane"]:
-                traci.trafficlight.setRedYellowGreenState(junction_id, EAST_WEST_GREEN)
-                set_signal_state.emergency_direction = "east_west"
-            set_signal_state.green_start_time = current_time
+    if emergency_here or state["emergency_active"]:
+        if emergency_here:
+            phase = junction.phase_for_lane(emergency_lane)
+            if not state["emergency_active"]:
+                print(f"[EVENT] Emergency detected at t={current_time}s, junction={junction_id}, lane={sensors['emergency_lane']}")
+                state["emergency_start_time"] = current_time
+                emit_event("emergency_start", junction_id, current_time,
+                           lane=sensors["emergency_lane"], phase=phase.name if phase else None)
+            elif phase is not None and phase.name != state["emergency_direction"]:
+                # the vehicle moved on to a lane served by another phase
+                emit_event("phase_change", junction_id, current_time, lane=sensors["emergency_lane"], phase=phase.name)
+            state["emergency_active"] = True
+            state["emergency_lane"] = sensors["emergency_lane"]
+            if phase is not None:
+                traci.trafficlight.setRedYellowGreenState(junction_id, phase.state)
+                state["emergency_direction"] = phase.name
+            state["green_start_time"] = current_time
 
         # When emergency is gone, start clearance phase
-        if not any(traci.vehicle.getVehicleClass(v) == "emergency" for v in traci.vehicle.getIDList()):
-            if set_signal_state.emergency_active:
-                print(f"[EVENT] Emergency cleared at t={current_time}s")
-                set_signal_state.emergency_active = False
-                set_signal_state.clearance_active = True
-                set_signal_state.clearance_start_time = current_time
+        if not emergency_in_network(traci, current_time):
+            if state["emergency_active"]:
+                print(f"[EVENT] Emergency cleared at t={current_time}s, junction={junction_id}")
+                emit_event("emergency_clear", junction_id, current_time,
+                           lane=state["emergency_lane"], phase=state["emergency_direction"],
+                           duration=current_time - state["emergency_start_time"])
+                emit_event("clearance_start", junction_id, current_time)
+                state["emergency_active"] = False
+                state["emergency_direction"] = None
+                state["emergency_lane"] = None
+                state["clearance_active"] = True
+                state["clearance_start_time"] = current_time
         return
 
     # --- Clearance Phase ---
-    if set_signal_state.clearance_active:
-        traci.trafficlight.setRedYellowGreenState(junction_id, ALL_RED)
-        if current_time - set_signal_state.clearance_start_time >= set_signal_state.clearance_duration:
-            set_signal_state.clearance_active = False
+    if state["clearance_active"]:
+        traci.trafficlight.setRedYellowGreenState(junction_id, junction.all_red)
+        if current_time - state["clearance_start_time"] >= set_signal_state.clearance_duration:
+            state["clearance_active"] = False
+            emit_event("clearance_end", junction_id, current_time,
+                       duration=current_time - state["clearance_start_time"])
+            # the next auto choice follows all-red, so it is a phase change even if unchanged
+            state["last_green"] = None
         return
 
     # --- Auto Mode ---
-    if sensors.get("mode") == "auto":
-        lane_counts = {lane: count for lane, count in sensors.items() if "_in_" in lane}
-        if current_time - set_signal_state.green_start_time >= set_signal_state.min_green_time:
-            north_south_count = sum(lane_counts[l] for l in ["north_in_0", "north_in_1", "south_in_0", "south_in_1"])
-            east_west_count = sum(lane_counts[l] for l in ["east_in_0", "east_in_1", "west_in_0", "west_in_1"])
+    if sensors.get("mode") == "auto" and junction.green_phases:
+        if current_time - state["green_start_time"] >= set_signal_state.min_green_time:
+            phases = junction.green_phases
 
-            if north_south_count >= east_west_count:
-                traci.trafficlight.setRedYellowGreenState(junction_id, NORTH_SOUTH_GREEN)
-                set_signal_state.last_green = "north_south"
-            else:
-                traci.trafficlight.setRedYellowGreenState(junction_id, EAST_WEST_GREEN)
-                set_signal_state.last_green = "east_west"
+            # Lookahead planner (if enabled) decides; busiest green phase is the fallback.
+            # Decisions are per junction: while the pool is still busy with one
+            # junction's, others deciding at the same time get the fallback.
+            chosen = None
+            if planner is not None:
+                name = planner.choose(
+                    traci, junction_id,
+                    {p.name: p.state for p in phases},
+                    [lane_ids[l] for l in junction.lanes],
+                )
+                chosen = next((p for p in phases if p.name == name), None)
+            if chosen is None:
+                counts = [sum(sensors.get(lane_ids[l], 0) for l in p.lanes) for p in phases]
+                chosen = phases[counts.index(max(counts))]
 
-            set_signal_state.green_start_time = current_time
+            traci.trafficlight.setRedYellowGreenState(junction_id, chosen.state)
+            if chosen.name != state["last_green"]:
+                emit_event("phase_change", junction_id, current_time, phase=chosen.name)
+            state["last_green"] = chosen.name
+            state["green_start_time"] = current_time
+
+
+def set_all_signals(traci, sensors):
+    """Run the controller for every traffic light in the network."""
+    if not traci:
+        return
+    net = get_network()
+    current_time = traci.simulation.getTime()
+    if sensors.get("mode") == "manual":
+        lane = net.lane_index.get(sensors.get("lane"))
+        junction_id = next((j.id for j in net.junctions.values() if lane in j.lanes), None)
+        emit_event("manual_override", junction_id, current_time,
+                   lane=sensors.get("lane"), phase=sensors.get("state"))
+    for junction_id in net.junctions:
+        set_signal_state(traci, junction_id, sensors, current_time)
 
 
 def add_sensor_noise(value, noise_level=0.1, min_val=0):
@@ -89,14 +267,41 @@ def add_sensor_noise(value, noise_level=0.1, min_val=0):
     Adds ±noise_level% random noise to a sensor reading.
     Ensures value doesn't drop below min_val.
     """
-    noise_factor = 1 + random.uniform(-noise_level, noise_level)
+    noise_factor = 1 + noise_rng.uniform(-noise_level, noise_level)
     noisy_value = value * noise_factor
     return max(min_val, round(noisy_value, 2))
 
 
-def simulate_sensors():
-    lanes = ["north_in_0", "north_in_1", "south_in_0", "south_in_1",
-             "east_in_0", "east_in_1", "west_in_0", "west_in_1"]
+def detect_emergency(sensors):
+    """Set sensors["emergency"] and sensors["emergency_lane"] from the vehicles in the network."""
+    for v in traci.vehicle.getIDList():
+        if traci.vehicle.getVehicleClass(v) == "emergency":
+            sensors["emergency"] = True
+            sensors["emergency_lane"] = traci.vehicle.getLaneID(v)
+            return
+    sensors["emergency"] = False
+    sensors["emergency_lane"] = None
+
+
+def subscribe_lanes(lanes):
+    """Subscribe to LANE_VARIABLES so each step's readings arrive in one round-trip."""
+    for lane in lanes:
+        traci.lane.subscribe(lane, LANE_VARIABLES)
+
+
+def simulate_sensors(window=1, jump=False):
+    """
+    Yields one sensor snapshot per simulation step, or per window of `window`
+    steps when window > 1 (see simulate_windowed_sensors). Every lane that
+    approaches a traffic light in the network is sensed.
+    """
+    net = get_network()
+    lanes = [net.lane_ids[i] for i in net.sensed_lanes]
+    subscribe_lanes(lanes)
+
+    if window > 1:
+        yield from simulate_windowed_sensors(lanes, window, jump)
+        return
 
     sensors = {lane: 0 for lane in lanes}
     sensors["queue_length"] = {lane: 0 for lane in lanes}
@@ -105,34 +310,121 @@ def simulate_sensors():
     sensors["emergency_lane"] = None
     sensors["mode"] = "auto"
 
-    junction_id = "junction1"
-
     while traci.simulation.getMinExpectedNumber() > 0:
         traci.simulationStep()
 
         # Collect lane counts, queue length, and speed (with noise)
+        results = traci.lane.getAllSubscriptionResults()
         for lane in lanes:
-            raw_count = traci.lane.getLastStepVehicleNumber(lane)
-            raw_queue = traci.lane.getLastStepHaltingNumber(lane)
-            raw_speed = traci.lane.getLastStepMeanSpeed(lane)
-
-            sensors[lane] = add_sensor_noise(raw_count, noise_level=0.05)
-            sensors["queue_length"][lane] = add_sensor_noise(raw_queue, noise_level=0.1)
-            sensors["avg_speed"][lane] = add_sensor_noise(raw_speed, noise_level=0.05)
+            reading = results[lane]
+            sensors[lane] = add_sensor_noise(reading[tc.LAST_STEP_VEHICLE_NUMBER], noise_level=0.05)
+            sensors["queue_length"][lane] = add_sensor_noise(reading[tc.LAST_STEP_VEHICLE_HALTING_NUMBER], noise_level=0.1)
+            sensors["avg_speed"][lane] = add_sensor_noise(reading[tc.LAST_STEP_MEAN_SPEED], noise_level=0.05)
 
         # Detect emergency vehicles
-        vehicle_ids = traci.vehicle.getIDList()
-        sensors["emergency"] = any(traci.vehicle.getVehicleClass(v) == "emergency" for v in vehicle_ids)
-        if sensors["emergency"]:
-            for v in vehicle_ids:
-                if traci.vehicle.getVehicleClass(v) == "emergency":
-                    sensors["emergency_lane"] = traci.vehicle.getLaneID(v)
-                    break
-        else:
-            sensors["emergency_lane"] = None
+        detect_emergency(sensors)
 
         # Update signals
-        set_signal_state(traci, junction_id, sensors)
+        set_all_signals(traci, sensors)
+
+        yield sensors
+
+    traci.close()
+
+
+def simulate_windowed_sensors(lanes, window, jump=False):
+    """
+    Coarse-tick mode: one aggregated snapshot per window of `window` steps.
+
+    - accumulate (default): run the steps back to back, summing raw lane readings
+      in place; the signal controller still runs every step.
+    - jump: advance the whole window with a single simulationStep(t) call and
+      read the lanes once at the end; the controller runs once per window.
+      Everything is a sample of the last step only: an emergency vehicle that
+      comes and goes inside the window is never seen, and one that is seen gets
+      no preemption until the end of the window. Use it for fast-forwarding,
+      not where emergency handling matters.
+
+    The snapshot keeps the per-step shape (lane counts, queue_length and
+    avg_speed hold window means; in accumulate mode emergency is true if any
+    step saw one) and adds sensors["window"] with the step count, which steps
+    were sampled ("every_step" or "end"), how often the controller ran, the
+    summed and max queue per lane and the simulation time at the end of the
+    window. Noise is applied once, to the window means.
+    """
+    n = len(lanes)
+    count_sum = [0] * n
+    queue_sum = [0] * n
+    queue_max = [0] * n
+    speed_sum = [0.0] * n
+
+    # Raw readings of the current step, handed to the controller
+    step = {lane: 0 for lane in lanes}
+    step["emergency"] = False
+    step["emergency_lane"] = None
+    step["mode"] = "auto"
+
+    sensors = {lane: 0 for lane in lanes}
+    sensors["queue_length"] = {lane: 0 for lane in lanes}
+    sensors["avg_speed"] = {lane: 0.0 for lane in lanes}
+    sensors["emergency"] = False
+    sensors["emergency_lane"] = None
+    sensors["mode"] = "auto"
+
+    def read_lanes():
+        results = traci.lane.getAllSubscriptionResults()
+        for i, lane in enumerate(lanes):
+            reading = results[lane]
+            count = reading[tc.LAST_STEP_VEHICLE_NUMBER]
+            queue = reading[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+            step[lane] = count
+            count_sum[i] += count
+            queue_sum[i] += queue
+            if queue > queue_max[i]:
+                queue_max[i] = queue
+            speed_sum[i] += reading[tc.LAST_STEP_MEAN_SPEED]
+
+    while traci.simulation.getMinExpectedNumber() > 0:
+        for i in range(n):
+            count_sum[i] = queue_sum[i] = queue_max[i] = 0
+            speed_sum[i] = 0.0
+        emergency_lane = None
+        any_emergency = False
+
+        if jump:
+            traci.simulationStep(traci.simulation.getTime() + window * traci.simulation.getDeltaT())
+            samples, steps = 1, window
+            read_lanes()
+            detect_emergency(step)
+            any_emergency, emergency_lane = step["emergency"], step["emergency_lane"]
+            set_all_signals(traci, step)
+        else:
+            samples = 0
+            while samples < window and traci.simulation.getMinExpectedNumber() > 0:
+                traci.simulationStep()
+                samples += 1
+                read_lanes()
+                detect_emergency(step)
+                if step["emergency"] and not any_emergency:
+                    any_emergency, emergency_lane = True, step["emergency_lane"]
+                set_all_signals(traci, step)
+            steps = samples
+
+        for i, lane in enumerate(lanes):
+            sensors[lane] = add_sensor_noise(count_sum[i] / samples, noise_level=0.05)
+            sensors["queue_length"][lane] = add_sensor_noise(queue_sum[i] / samples, noise_level=0.1)
+            sensors["avg_speed"][lane] = add_sensor_noise(speed_sum[i] / samples, noise_level=0.05)
+        sensors["emergency"] = any_emergency
+        sensors["emergency_lane"] = emergency_lane
+        sensors["window"] = {
+            "steps": steps,
+            "samples": samples,
+            "sampled": "end" if jump else "every_step",
+            "controller_runs": samples,
+            "sim_time": traci.simulation.getTime(),
+            "queue_sum": dict(zip(lanes, queue_sum)),
+            "queue_max": dict(zip(lanes, queue_max)),
+        }
 
         yield sensors
 
@@ -0,0 +1,60 @@
+"""
+Simulation backends: how the process talks to SUMO.
+
+- "traci": SUMO runs as a child process and every call is a socket round-trip.
+- "libsumo": SUMO runs inside this process; the same API calls are plain
+  function calls, so there is no IPC at all. Only one libsumo simulation can
+  exist per process, and a step holds the GIL while it runs.
+
+Both expose the TraCI API (simulation, lane, vehicle, trafficlight, ...), so the
+rest of the code uses the object returned by start() the same way either way.
+SIM_BACKEND selects the backend; "libsumo" falls back to "traci" when the
+libsumo module is not installed.
+"""
+import traci
+
+BACKENDS = ("traci", "libsumo")
+
+
+class TraciBackend:
+    name = "traci"
+    errors = (traci.exceptions.TraCIException, traci.exceptions.FatalTraCIError)
+
+    def __init__(self):
+        self.api = traci
+
+    def start(self, sumo_cmd):
+        traci.start(sumo_cmd)
+        return self.api
+
+    def close(self):
+        # don't wait for the SUMO process to exit
+        traci.close(False)
+
+
+class LibsumoBackend:
+    name = "libsumo"
+
+    def __init__(self):
+        import libsumo
+        self.api = libsumo
+        self.errors = (libsumo.TraCIException, libsumo.FatalTraCIError)
+
+    def start(self, sumo_cmd):
+        self.api.start(sumo_cmd)
+        return self.api
+
+    def close(self):
+        self.api.close()
+
+
+def get_backend(name="traci"):
+    """Backend instance for a SIM_BACKEND value."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown simulation backend {name!r} (expected one of {', '.join(BACKENDS)})")
+    if name == "libsumo":
+        try:
+            return LibsumoBackend()
+        except ImportError as e:
+            print(f"libsumo unavailable ({e}); falling back to the TraCI backend")
+    return TraciBackend()
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from app import create_app, ensure_db_and_default_user
+from config import DevelopmentConfig
+from models import db, Simulation
+
+
+@pytest.fixture
+def client(tmp_path):
+    class TestConfig(DevelopmentConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        RETENTION_ENABLED = False
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        ensure_db_and_default_user()
+    client = app.test_client()
+    token = client.post("/api/login", json={"username": "admin", "password": "admin"}).json["token"]
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    client.application = app
+    return client
+
+
+def test_simulations_revalidate_after_resume_and_end(client):
+    app = client.application
+    started = datetime.datetime(2026, 1, 1, 12, 0)
+    with app.app_context():
+        db.session.add(Simulation(start_time=started, end_time=started + datetime.timedelta(minutes=5)))
+        db.session.commit()
+
+    first = client.get("/api/simulations")
+    etag = first.headers["ETag"]
+    assert client.get("/api/simulations", headers={"If-None-Match": etag}).status_code == 304
+
+    # what runtime.resume_simulation() and a later end do to the row
+    with app.app_context():
+        sim = db.session.get(Simulation, 1)
+        sim.end_time = None
+        sim.generation += 1
+        db.session.commit()
+        sim.end_time = started + datetime.timedelta(minutes=9)
+        db.session.commit()
+
+    second = client.get("/api/simulations", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json[0]["end_time"] != first.json[0]["end_time"]
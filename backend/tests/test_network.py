@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+import network
+from network import load_network, parse_network, sumocfg_net_file
+
+NET_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<net version="1.9">
+    <location netOffset="0.00,0.00"/>
+    <edge id=":J_0" function="internal">
+        <lane id=":J_0_0" index="0" speed="13.89" length="5.00" shape="0,0 1,1"/>
+    </edge>
+    <edge id="north_in" from="N" to="J" name="Main Street">
+        <lane id="north_in_0" index="0" speed="13.89" length="100.00" shape="0,100 0,0"/>
+        <lane id="north_in_1" index="1" speed="13.89" length="100.00" shape="3,100 3,0"/>
+    </edge>
+    <edge id="east_in" from="E" to="J">
+        <lane id="east_in_0" index="0" speed="13.89" length="100.00" shape="100,0 0,0"/>
+    </edge>
+    <edge id="south_out" from="J" to="S">
+        <lane id="south_out_0" index="0" speed="13.89" length="100.00" shape="0,0 0,-100"/>
+    </edge>
+    <tlLogic id="J" type="static" programID="0" offset="0">
+        <phase duration="30" state="GGr"/>
+        <phase duration="3"  state="yyr"/>
+        <phase duration="30" state="rrG"/>
+        <phase duration="3"  state="rrr"/>
+    </tlLogic>
+    <junction id="J" type="traffic_light" x="0" y="0" incLanes="north_in_0 north_in_1 east_in_0" intLanes=":J_0_0" shape="0,0"/>
+    <connection from="north_in" to="south_out" fromLane="0" toLane="0" tl="J" linkIndex="0" dir="s" state="O"/>
+    <connection from="north_in" to="south_out" fromLane="1" toLane="0" tl="J" linkIndex="1" dir="s" state="O"/>
+    <connection from="east_in" to="south_out" fromLane="0" toLane="0" tl="J" linkIndex="2" dir="r" state="O"/>
+</net>
+"""
+
+SUMOCFG = """<configuration>
+    <input>
+        <net-file value="test.net.xml"/>
+    </input>
+</configuration>
+"""
+
+
+@pytest.fixture
+def net_files(tmp_path):
+    net_path = tmp_path / "test.net.xml"
+    net_path.write_text(NET_XML)
+    cfg_path = tmp_path / "test.sumocfg"
+    cfg_path.write_text(SUMOCFG)
+    return str(net_path), str(cfg_path)
+
+
+def test_lanes_are_interned(net_files):
+    net = parse_network(net_files[0])
+    # internal edges are skipped
+    assert net.lane_ids == ["north_in_0", "north_in_1", "east_in_0", "south_out_0"]
+    assert net.lane_index["east_in_0"] == 2
+    assert net.lane_edges[1] == "north_in"
+    assert net.lane_numbers[1] == 1
+
+
+def test_junction_and_green_phases(net_files):
+    net = parse_network(net_files[0])
+    junction = net.junctions["J"]
+    assert junction.lanes == [0, 1, 2]
+    assert junction.link_count == 3
+    assert junction.all_red == "rrr"
+    # yellow and all-red phases are not green phases
+    assert [(p.index, p.name, p.lanes) for p in junction.green_phases] == [
+        (0, "north_in", [0, 1]),
+        (2, "east_in", [2]),
+    ]
+    assert junction.phase_for_lane(2).name == "east_in"
+    assert junction.phase_for_lane(3) is None
+    assert net.sensed_lanes == [0, 1, 2]
+
+
+def test_lane_label(net_files):
+    net = parse_network(net_files[0])
+    assert net.lane_label("north_in_1") == "Main Street (Lane 2)"
+    assert net.lane_label("east_in_0") == "east_in (Lane 1)"
+    assert net.lane_label("unknown") == "unknown"
+
+
+def test_load_network_uses_cache(net_files, monkeypatch):
+    net_path, cfg_path = net_files
+    assert sumocfg_net_file(cfg_path) == net_path
+    first = load_network(cfg_path)
+    cache_files = [f for f in os.listdir(os.path.dirname(net_path)) if f.endswith(".stms-cache")]
+    assert len(cache_files) == 1
+
+    def no_parse(path):
+        raise AssertionError("parsed the XML despite the cache")
+
+    monkeypatch.setattr(network, "parse_network", no_parse)
+    second = load_network(cfg_path)
+    assert second.lane_ids == first.lane_ids
+    assert second.junctions["J"].green_phases == first.junctions["J"].green_phases
+
+
+def test_changed_net_file_is_parsed_again(net_files):
+    net_path, cfg_path = net_files
+    load_network(cfg_path)
+    with open(net_path, "a") as f:
+        f.write("<!-- edited -->\n")
+    assert load_network(cfg_path).lane_ids[0] == "north_in_0"
+    cache_files = [f for f in os.listdir(os.path.dirname(net_path)) if f.endswith(".stms-cache")]
+    assert len(cache_files) == 1
@@ -0,0 +1,32 @@
+import shutil
+
+import pytest
+
+pytest.importorskip("traci")
+pytestmark = pytest.mark.skipif(shutil.which("sumo") is None, reason="needs the sumo binary")
+
+import simulation  # noqa: E402
+from planner import LookaheadPlanner  # noqa: E402
+
+
+def steps_to_drain(planner):
+    """Steps the bundled scenario takes to empty, with the given planner (or the greedy rule)."""
+    simulation.noise_rng.seed(0)
+    assert simulation.start_simulation("traci")
+    simulation.reset_controller_state()
+    simulation.enable_planner(planner)
+    try:
+        return sum(1 for _ in simulation.simulate_sensors())
+    finally:
+        simulation.enable_planner(None)
+
+
+def test_planner_drains_no_slower_than_greedy():
+    greedy = steps_to_drain(None)
+    # a generous budget so every plan is scored and the run is deterministic
+    planner = LookaheadPlanner(simulation.sumo_config_path(), workers=2, budget_ms=10000)
+    try:
+        planned = steps_to_drain(planner)
+    finally:
+        planner.shutdown()
+    assert planned <= greedy
@@ -0,0 +1,110 @@
+import pickle
+import time
+import uuid
+from multiprocessing import Pipe
+
+import pytest
+
+from serving import HEADER_SIZE, SimulationClient, SnapshotBuffer, recv_message, send_message
+
+
+@pytest.fixture
+def buffers():
+    name = f"stms_test_{uuid.uuid4().hex[:8]}"
+    owner = SnapshotBuffer.create(name, HEADER_SIZE + 64)
+    reader = SnapshotBuffer.attach(name)
+    yield owner, reader
+    reader.close()
+    owner.close()
+
+
+def client_for(name, stale_after=5):
+    return SimulationClient({
+        "SIM_SNAPSHOT_SHM": name,
+        "SIM_CONTROL_ADDRESS": "127.0.0.1:0",
+        "SIM_CONTROL_AUTHKEY": "test",
+        "SIM_CONTROL_TIMEOUT": 1,
+        "SIM_OWNER_STALE_SECONDS": stale_after,
+    })
+
+
+def test_read_before_first_publish(buffers):
+    owner, reader = buffers
+    assert reader.read() is None
+
+
+def test_publish_then_read(buffers):
+    owner, reader = buffers
+    owner.publish(b'{"a": 1}')
+    seq, payload = reader.read()
+    assert payload == b'{"a": 1}'
+    assert seq % 2 == 0
+
+    owner.publish(b"{}")
+    next_seq, payload = reader.read()
+    assert payload == b"{}"
+    assert next_seq > seq
+
+
+def test_read_unchanged_returns_cached_payload(buffers):
+    owner, reader = buffers
+    owner.publish(b"[1]")
+    assert reader.read() == reader.read()
+
+
+def test_oversize_payload_rejected(buffers):
+    owner, reader = buffers
+    owner.publish(b"[1]")
+    with pytest.raises(ValueError):
+        owner.publish(b"x" * 65)
+    # the previous snapshot stays readable
+    assert reader.read()[1] == b"[1]"
+
+
+def test_torn_write_is_not_returned(buffers):
+    owner, reader = buffers
+    owner.publish(b"[1]")
+    # what a reader sees while the owner is mid-publish: an odd sequence number
+    seq, _ = reader.read()
+    reader.shm.buf[0:8] = (seq + 1).to_bytes(8, "little")
+    assert reader.read(retries=3) is None
+
+
+def test_heartbeat(buffers):
+    owner, reader = buffers
+    assert reader.heartbeat() == 0.0
+    owner.beat()
+    assert time.time() - reader.heartbeat() < 1
+    owner.publish(b"{}")
+    assert time.time() - reader.heartbeat() < 1
+
+
+def test_client_serves_fresh_snapshot(buffers):
+    owner, reader = buffers
+    owner.publish(b'{"simulation_running": true}')
+    assert client_for(owner.shm.name.lstrip("/")).snapshot() == b'{"simulation_running": true}'
+
+
+def test_client_rejects_stale_snapshot(buffers):
+    owner, reader = buffers
+    owner.publish(b'{"simulation_running": true}')
+    owner.shm.buf[16:24] = (0).to_bytes(8, "little")  # last beat long ago
+    assert client_for(owner.shm.name.lstrip("/")).snapshot() is None
+
+
+def test_client_without_owner():
+    assert client_for("stms_test_missing").snapshot() is None
+
+
+def test_control_messages_round_trip():
+    left, right = Pipe()
+    send_message(left, {"command": "start", "window": 5, "jump": False})
+    assert recv_message(right) == {"command": "start", "window": 5, "jump": False}
+
+
+@pytest.mark.parametrize("raw", [pickle.dumps({"command": "end"}), b"[1, 2]", b"not json"])
+def test_control_messages_must_be_json_objects(raw):
+    left, right = Pipe()
+    left.send_bytes(raw)
+    with pytest.raises(ValueError):
+        recv_message(right)